@@ -0,0 +1,149 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = "index.json"
+
+
+class ArchiveCache:
+    """
+    On-disk LRU cache of downloaded .rtm archives, keyed by map ID.
+
+    Each entry keeps the ETag / Last-Modified validators it was served with so
+    the next download can be made conditional. Entries are evicted least
+    recently used first once the total size exceeds `max_bytes`.
+
+    Methods are called from worker threads, so the index is only touched
+    under a lock and every file is written through its own temporary file.
+    Cache hits only update recency in memory; it reaches index.json with the
+    next write, so a restart can forget hits since the last store.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._index = self._load_index()
+
+    def _index_path(self):
+        return os.path.join(self.directory, INDEX_FILENAME)
+
+    def _archive_path(self, map_id):
+        return os.path.join(self.directory, f"{map_id}.rtm")
+
+    def _load_index(self):
+        try:
+            with open(self._index_path(), "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            logger.warning("Archive cache index is unreadable, starting empty")
+            return {}
+
+        # Drop entries whose archive has gone missing
+        return {
+            map_id: entry for map_id, entry in index.items()
+            if os.path.exists(self._archive_path(map_id))
+        }
+
+    def _write_temp(self, write):
+        """Write a new uniquely named file in the cache directory and return its path."""
+        with tempfile.NamedTemporaryFile(dir=self.directory, suffix=".tmp", delete=False) as f:
+            try:
+                write(f)
+            except BaseException:
+                f.close()
+                os.remove(f.name)
+                raise
+        return f.name
+
+    def _save_index(self):
+        # Caller holds the lock
+        data = json.dumps(self._index).encode("utf-8")
+        os.replace(self._write_temp(lambda f: f.write(data)), self._index_path())
+
+    @property
+    def total_bytes(self):
+        with self._lock:
+            return sum(entry["size"] for entry in self._index.values())
+
+    def lookup(self, map_id):
+        """Return the cached entry's validators, or None if the map isn't cached."""
+        with self._lock:
+            entry = self._index.get(map_id)
+            if entry and not os.path.exists(self._archive_path(map_id)):
+                self._index.pop(map_id)
+                self._save_index()
+                return None
+            return dict(entry) if entry else None
+
+    def open(self, map_id):
+        """
+        Open the cached archive for reading and mark the entry as recently
+        used. Returns None if it was evicted or discarded in the meantime.
+        """
+        with self._lock:
+            if map_id not in self._index:
+                return None
+            try:
+                f = open(self._archive_path(map_id), "rb")
+            except FileNotFoundError:
+                self._index.pop(map_id)
+                self._save_index()
+                return None
+            self._index[map_id]["last_access"] = time.time()
+            return f
+
+    def store(self, map_id, fileobj, etag=None, last_modified=None):
+        """Copy an archive from a seekable file object into the cache, then rewind it."""
+        size = fileobj.seek(0, os.SEEK_END)
+        fileobj.seek(0)
+        if size > self.max_bytes:
+            self.discard(map_id)
+            return
+
+        # Copied outside the lock into a private file, then swapped in
+        tmp_path = self._write_temp(lambda f: shutil.copyfileobj(fileobj, f))
+        fileobj.seek(0)
+
+        with self._lock:
+            os.replace(tmp_path, self._archive_path(map_id))
+            self._index[map_id] = {
+                "etag": etag,
+                "last_modified": last_modified,
+                "size": size,
+                "last_access": time.time()
+            }
+            self._evict()
+            self._save_index()
+
+    def discard(self, map_id):
+        with self._lock:
+            if self._index.pop(map_id, None) is not None:
+                self._save_index()
+            try:
+                os.remove(self._archive_path(map_id))
+            except FileNotFoundError:
+                pass
+
+    def _evict(self):
+        # Caller holds the lock
+        total = sum(entry["size"] for entry in self._index.values())
+        for map_id, entry in sorted(self._index.items(), key=lambda item: item[1]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            total -= entry["size"]
+            self._index.pop(map_id)
+            try:
+                os.remove(self._archive_path(map_id))
+            except FileNotFoundError:
+                pass
+            logger.info(f"Evicted cached archive {map_id}")
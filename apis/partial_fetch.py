@@ -0,0 +1,223 @@
+import asyncio
+import io
+import logging
+import re
+import zipfile
+
+from utils.ingest import read_response
+
+logger = logging.getLogger(__name__)
+
+# The end of central directory record plus the largest possible zip comment
+TAIL_BYTES = 64 * 1024 + 22
+MEDIA_HEAD_BYTES = 64 * 1024
+MEDIA_TAIL_BYTES = 16 * 1024
+# Covers local headers whose extra field is longer than the central one
+LOCAL_HEADER_SLACK = 1024
+# Ranges closer together than this are fetched as one request
+MERGE_GAP_BYTES = 64 * 1024
+MIN_FETCH_BYTES = 64 * 1024
+MAX_ROUNDS = 8
+
+MEDIA_EXTENSIONS = (".jpg", ".jpeg", ".png", ".mp3", ".ogg", ".wav", ".mp4", ".webm")
+
+CONTENT_RANGE_RE = re.compile(r"bytes (\d+)-(\d+)/(\d+)")
+
+
+class MissingRange(Exception):
+    """Raised when a read touches bytes of a SparseArchive that weren't fetched."""
+
+    def __init__(self, start, end):
+        # Keep both offsets in args so the exception survives pickling
+        super().__init__(start, end)
+        self.start = start
+        self.end = end
+
+    def __str__(self):
+        return f"Bytes {self.start}-{self.end} have not been fetched"
+
+
+class RangeNotSupported(Exception):
+    pass
+
+
+class SparseArchive(io.RawIOBase):
+    """
+    Seekable file of a known size where only some byte ranges are present.
+    Reading outside of them raises MissingRange so the caller can fetch them.
+    """
+
+    def __init__(self, size):
+        super().__init__()
+        self.size = size
+        self._chunks = []  # sorted, non-touching (start, bytes)
+        self._pos = 0
+
+    @property
+    def fetched_bytes(self):
+        return sum(len(data) for _, data in self._chunks)
+
+    def add(self, start, data):
+        chunks = []
+        for chunk_start, chunk in sorted(self._chunks + [(start, data)], key=lambda c: c[0]):
+            if chunks and chunk_start <= chunks[-1][0] + len(chunks[-1][1]):
+                # Overlapping or touching the previous chunk: extend it
+                prev_start, prev = chunks[-1]
+                overlap = prev_start + len(prev) - chunk_start
+                if overlap < len(chunk):
+                    chunks[-1] = (prev_start, prev + chunk[overlap:])
+            else:
+                chunks.append((chunk_start, bytes(chunk)))
+        self._chunks = chunks
+
+    def missing(self, start, end):
+        """Return the sub-ranges of [start, end) that haven't been fetched."""
+        end = min(end, self.size)
+        gaps = []
+        pos = start
+        for chunk_start, chunk in self._chunks:
+            chunk_end = chunk_start + len(chunk)
+            if chunk_end <= pos:
+                continue
+            if chunk_start >= end:
+                break
+            if chunk_start > pos:
+                gaps.append((pos, chunk_start))
+            pos = max(pos, chunk_end)
+            if pos >= end:
+                break
+        if pos < end:
+            gaps.append((pos, end))
+        return gaps
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence ({whence})")
+        if pos < 0:
+            raise ValueError("Negative seek position")
+        self._pos = pos
+        return pos
+
+    def readinto(self, buffer):
+        start = self._pos
+        end = min(start + len(buffer), self.size)
+        if end <= start:
+            return 0
+
+        for chunk_start, chunk in self._chunks:
+            if chunk_start <= start and end <= chunk_start + len(chunk):
+                size = end - start
+                buffer[:size] = chunk[start - chunk_start:end - chunk_start]
+                self._pos = end
+                return size
+
+        raise MissingRange(start, end)
+
+
+def merge_ranges(ranges, gap=MERGE_GAP_BYTES):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + gap:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(r) for r in merged]
+
+
+def plan_member_ranges(archive):
+    """
+    Return the byte ranges of the members analyze_beatmap reads: whole JSON
+    files and compressed media, plus the head and tail of stored media files.
+    Opening the central directory may itself raise MissingRange.
+    """
+    ranges = []
+    with zipfile.ZipFile(archive, 'r') as z:
+        for info in z.infolist():
+            name = info.filename.lower()
+            header_end = (
+                info.header_offset + zipfile.sizeFileHeader
+                + len(info.filename.encode("utf-8")) + len(info.extra) + LOCAL_HEADER_SLACK
+            )
+            data_end = header_end + info.compress_size
+
+            if name.endswith(".json") or (name.endswith(MEDIA_EXTENSIONS) and info.compress_type != zipfile.ZIP_STORED):
+                ranges.append((info.header_offset, data_end))
+            elif name.endswith(MEDIA_EXTENSIONS):
+                ranges.append((info.header_offset, min(header_end + MEDIA_HEAD_BYTES, data_end)))
+                ranges.append((max(data_end - MEDIA_TAIL_BYTES - LOCAL_HEADER_SLACK, info.header_offset), data_end))
+
+    return [(start, min(end, archive.size)) for start, end in ranges]
+
+
+def parse_content_range(header):
+    match = CONTENT_RANGE_RE.fullmatch(header or "")
+    if not match:
+        return None
+    return tuple(int(group) for group in match.groups())
+
+
+async def fetch_range(session, url, start, end):
+    """
+    Fetch bytes [start, end) of url; raises RangeNotSupported unless they are
+    served as a 206 of exactly that range.
+    """
+    headers = {"Range": f"bytes={start}-{end - 1}"}
+    async with session.get(url, headers=headers) as r:
+        if r.status != 206:
+            raise RangeNotSupported(f"HTTP {r.status} for a range request")
+        content_range = parse_content_range(r.headers.get("Content-Range"))
+        if not content_range:
+            raise RangeNotSupported("Missing Content-Range")
+        if content_range[:2] != (start, end - 1) or r.content_length not in (None, end - start):
+            raise RangeNotSupported(f"Asked for bytes {start}-{end - 1}, got {r.headers.get('Content-Range')}")
+        return start, await read_response(r, end - start)
+
+
+async def fetch_missing(session, url, archive, ranges):
+    gaps = []
+    for start, end in ranges:
+        gaps.extend(archive.missing(start, end))
+    gaps = merge_ranges(gaps)
+    if not gaps:
+        return
+
+    chunks = await asyncio.gather(*(fetch_range(session, url, start, end) for start, end in gaps))
+    for start, data in chunks:
+        archive.add(start, data)
+
+
+async def load_partial(session, url, archive, analyze, max_rounds=MAX_ROUNDS):
+    """
+    Fetch what the async callable `analyze` needs from a SparseArchive holding
+    the archive's tail: first the planned member ranges, then whatever reads
+    still miss, round by round. Returns analyze's result, or raises
+    RangeNotSupported when the archive can't be resolved within max_rounds.
+    """
+    planned = False
+    for _ in range(max_rounds):
+        try:
+            if not planned:
+                await fetch_missing(session, url, archive, plan_member_ranges(archive))
+                planned = True
+            archive.seek(0)
+            return await analyze(archive)
+        except MissingRange as e:
+            end = max(e.end, e.start + MIN_FETCH_BYTES)
+            await fetch_missing(session, url, archive, [(e.start, end)])
+
+    raise RangeNotSupported(f"Archive not resolved after {max_rounds} rounds")
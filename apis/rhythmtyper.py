@@ -1,10 +1,25 @@
+import asyncio
 import aiohttp
+import logging
 import zipfile
 import json
 import re
-from io import BytesIO
-from PIL import Image
-from mutagen import File as MutagenFile
+import config
+from apis.partial_fetch import TAIL_BYTES, RangeNotSupported, SparseArchive, load_partial, parse_content_range
+from utils import memory
+from utils.archive_limits import check_archive_limits
+from utils.ingest import ArchiveTooLarge, ingest_response, read_response
+from utils.metrics import CACHE_REQUESTS
+from utils.ttl_cache import TTLCache
+from utils.parsed_difficulty import ParsedDifficulty
+from utils.media_probe import is_random_access, open_member, probe_audio, probe_image_size, probe_video
+
+logger = logging.getLogger(__name__)
+
+VIDEO_SCAN_LIMIT = 1024 * 1024
+
+_MISSING = object()
+_NOT_FOUND = object()
 
 
 def extract_beatmap_id_from_url(url):
@@ -23,28 +38,192 @@ def format_timestamp(ms):
     centiseconds = int((ms % 1000) / 10)
     return f"{minutes}:{seconds:02d}:{centiseconds:02d}"
 
-async def fetch_online_beatmap_metadata(map_id):
+class RhythmTyperClient:
+    """
+    RhythmTyper API client backed by one pooled aiohttp session, so requests
+    reuse keep-alive connections and cached DNS lookups.
+    """
+
+    def __init__(
+        self,
+        api_url=config.RT_API_URL,
+        storage_url=config.RT_STORAGE_URL,
+        connection_limit=config.HTTP_CONNECTION_LIMIT,
+        connection_limit_per_host=config.HTTP_CONNECTION_LIMIT_PER_HOST,
+        dns_cache_ttl=config.HTTP_DNS_CACHE_TTL,
+        keepalive_timeout=config.HTTP_KEEPALIVE_TIMEOUT,
+        request_timeout=config.HTTP_REQUEST_TIMEOUT,
+        archive_cache=None,
+        metadata_cache_size=config.METADATA_CACHE_SIZE,
+        metadata_cache_ttl=config.METADATA_CACHE_TTL,
+        metadata_cache_negative_ttl=config.METADATA_CACHE_NEGATIVE_TTL
+    ):
+        self.api_url = api_url.rstrip("/")
+        self.storage_url = storage_url.rstrip("/")
+        self.connection_limit = connection_limit
+        self.connection_limit_per_host = connection_limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.request_timeout = request_timeout
+        self.archive_cache = archive_cache
+        self.metadata_cache = TTLCache(metadata_cache_size, metadata_cache_ttl)
+        self.metadata_cache_negative_ttl = metadata_cache_negative_ttl
+        self.session = None
+
+    async def start(self):
+        if self.session and not self.session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.connection_limit,
+            limit_per_host=self.connection_limit_per_host,
+            use_dns_cache=True,
+            ttl_dns_cache=self.dns_cache_ttl,
+            keepalive_timeout=self.keepalive_timeout
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.request_timeout)
+        )
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+            self.session = None
 
-    url = f"https://us-central1-rhythm-typer.cloudfunctions.net/api/getBeatmaps?limit=1&mapsetId={map_id}"
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as resp:
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _require_session(self):
+        if not self.session or self.session.closed:
+            raise RuntimeError("RhythmTyper client is not started.")
+        return self.session
+
+    async def fetch_online_beatmap_metadata(self, map_id):
+        cached = self.metadata_cache.get(map_id, _MISSING)
+        CACHE_REQUESTS.inc(cache="metadata", result="miss" if cached is _MISSING else "hit")
+        if cached is _NOT_FOUND:
+            raise ValueError(f"Map with id {map_id} does not exist.")
+        if cached is not _MISSING:
+            return cached
+        
+        url = f"{self.api_url}/getBeatmaps"
+        params = {"limit": 1, "mapsetId": map_id}
+        async with self._require_session().get(url, params=params) as resp:
             if resp.status == 403:
+                self.metadata_cache.set(map_id, _NOT_FOUND, ttl=self.metadata_cache_negative_ttl)
                 raise ValueError(f"Map with id {map_id} does not exist.")
             if resp.status != 200:
                 raise RuntimeError(f"Failed to fetch metadata: HTTP {resp.status}")
-            return await resp.json()
+            metadata = await resp.json()
+        
+        # An empty result is also a "not found", just reported differently
+        ttl = None if metadata.get("beatmaps") else self.metadata_cache_negative_ttl
+        self.metadata_cache.set(map_id, metadata, ttl=ttl)
+        return metadata
 
-async def fetch_beatmap(map_id):
+    async def fetch_beatmap(self, map_id, revalidate=True):
+        url = f"{self.storage_url}/beatmaps/{map_id}/{map_id}.rtm"
+        
+        cached = self.archive_cache.lookup(map_id) if self.archive_cache and revalidate else None
+        headers = {}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+        
+        evicted = False
+        async with self._require_session().get(url, headers=headers) as r:
+            if r.status == 304 and cached:
+                zip_file = await asyncio.to_thread(self.archive_cache.open, map_id)
+                if zip_file is not None:
+                    CACHE_REQUESTS.inc(cache="archive", result="hit")
+                    logger.info(f"Archive cache hit for map {map_id}")
+                    return zip_file
+                # Evicted by a concurrent store since the lookup
+                evicted = True
+            else:
+                if self.archive_cache:
+                    CACHE_REQUESTS.inc(cache="archive", result="miss")
+                if r.status == 403:
+                    if self.archive_cache:
+                        self.archive_cache.discard(map_id)
+                    raise ValueError(f"Map with id {map_id} does not exist.")
+                if r.status != 200:
+                    raise RuntimeError(f"Failed to download map: HTTP {r.status}")
+                
+                zip_file = await ingest_response(r)
+        
+        if evicted:
+            logger.info(f"Cached archive for map {map_id} is gone, downloading it again")
+            return await self.fetch_beatmap(map_id, revalidate=False)
+        
+        await self._cache_archive(map_id, zip_file, r.headers)
+        return zip_file
 
-    url = f"https://storage.googleapis.com/rhythm-typer.firebasestorage.app/beatmaps/{map_id}/{map_id}.rtm"
-    
-    async with aiohttp.ClientSession() as s, s.get(url) as r:
-        if r.status == 403:
-            raise ValueError(f"Map with id {map_id} does not exist.")
-        if r.status != 200:
-            raise RuntimeError(f"Failed to download map: HTTP {r.status}")
+    async def _cache_archive(self, map_id, zip_file, headers):
+        if self.archive_cache and (headers.get("ETag") or headers.get("Last-Modified")):
+            await asyncio.to_thread(
+                self.archive_cache.store,
+                map_id,
+                zip_file,
+                headers.get("ETag"),
+                headers.get("Last-Modified")
+            )
+
+    async def fetch_beatmap_partial(self, map_id, analyze):
+        """
+        Fetch only the parts of the archive that the async callable `analyze`
+        reads, using HTTP Range requests, and return (archive, result). Falls
+        back to a full download when the map is already cached or the server
+        doesn't honour Range.
+        """
+        if self.archive_cache and self.archive_cache.lookup(map_id):
+            zip_bytes = await self.fetch_beatmap(map_id)
+            return zip_bytes, await analyze(zip_bytes)
+        
+        url = f"{self.storage_url}/beatmaps/{map_id}/{map_id}.rtm"
+        headers = {"Range": f"bytes=-{TAIL_BYTES}"}
+        
+        async with self._require_session().get(url, headers=headers) as r:
+            if r.status == 403:
+                raise ValueError(f"Map with id {map_id} does not exist.")
+            full = r.status == 200
+            if full:
+                # Range ignored, so this already is the full download
+                if self.archive_cache:
+                    CACHE_REQUESTS.inc(cache="archive", result="miss")
+                zip_bytes = await ingest_response(r)
+            content_range = parse_content_range(r.headers.get("Content-Range")) if r.status == 206 else None
+            tail = None
+            if content_range:
+                # Refuse an oversize archive before reading any of it
+                if config.MAX_ARCHIVE_BYTES and content_range[2] > config.MAX_ARCHIVE_BYTES:
+                    raise ArchiveTooLarge.for_limit(config.MAX_ARCHIVE_BYTES)
+                tail = await read_response(r, min(TAIL_BYTES, content_range[2]))
         
-        return BytesIO(await r.read())
+        if full:
+            await self._cache_archive(map_id, zip_bytes, r.headers)
+            return zip_bytes, await analyze(zip_bytes)
+        
+        if content_range:
+            archive = SparseArchive(content_range[2])
+            archive.add(content_range[0], tail)
+            try:
+                result = await load_partial(self.session, url, archive, analyze)
+                logger.info(f"Partially fetched map {map_id}: {archive.fetched_bytes} of {archive.size} bytes")
+                return archive, result
+            except (RangeNotSupported, zipfile.BadZipFile) as e:
+                # A broken central directory is reported by analyzing the full download
+                logger.info(f"Partial fetch of map {map_id} failed ({e}), downloading it in full")
+        
+        zip_bytes = await self.fetch_beatmap(map_id)
+        return zip_bytes, await analyze(zip_bytes)
+
 
 def analyze_beatmap(zip_bytes):
 
@@ -54,49 +233,68 @@ def analyze_beatmap(zip_bytes):
         "background": None,
         "audio": None,
         "video": None,
-        "hitsounds": []
+        "hitsounds": [],
+        "media_probed": True
     }
     
     with zipfile.ZipFile(zip_bytes, 'r') as z:
+        total_bytes = check_archive_limits(z)
+        if config.MAX_UNCOMPRESSED_BYTES and total_bytes > config.MAX_UNCOMPRESSED_BYTES:
+            # Still worth checking the charts, just without reading into the media
+            logger.warning(
+                f"Archive unpacks to {total_bytes} bytes, over the {config.MAX_UNCOMPRESSED_BYTES} byte budget; "
+                f"skipping media probing"
+            )
+            result["media_probed"] = False
+        
         for f in z.namelist():
             info = z.getinfo(f)
             
             if f == "meta.json":
-                result["meta"] = json.loads(z.read(f))
+                with memory.track("analyze.json"):
+                    result["meta"] = json.loads(z.read(f))
             elif f.endswith(".json"):
-                result["difficulties"].append({
-                    "filename": f,
-                    "data": json.loads(z.read(f))
-                })
-            elif f.lower().endswith((".jpg", ".jpeg", ".png")):
-                img_bytes = z.read(f)
-                with Image.open(BytesIO(img_bytes)) as img:
-                    result["background"] = {
+                with memory.track("analyze.json"):
+                    result["difficulties"].append({
                         "filename": f,
-                        "width": img.width,
-                        "height": img.height,
-                        "size_bytes": info.file_size
-                    }
+                        "data": json.loads(z.read(f))
+                    })
+            elif f.lower().endswith((".jpg", ".jpeg", ".png")):
+                width = height = None
+                if result["media_probed"]:
+                    with memory.track("analyze.background"), z.open(f) as img:
+                        width, height = probe_image_size(img)
+                result["background"] = {
+                    "filename": f,
+                    "width": width,
+                    "height": height,
+                    "size_bytes": info.file_size
+                }
             elif f.lower().startswith("audio.") and f.lower().endswith((".mp3", ".ogg", ".wav")):
-                audio_bytes = BytesIO(z.read(f))
-                audio_file = MutagenFile(audio_bytes)
-                duration = audio_file.info.length if audio_file and audio_file.info else None
-                
-                bitrate = None
-                if duration and duration > 0:
-                    bits = info.file_size * 8
-                    bitrate = (bits / duration) / 1000  # kbps
+                probe = {"duration": None, "bitrate": None}
+                if result["media_probed"]:
+                    with memory.track("analyze.audio"), open_member(z, info) as audio:
+                        probe = probe_audio(audio, info.file_size)
                 
                 result["audio"] = {
                     "filename": f,
                     "size_bytes": info.file_size,
-                    "duration": duration,
-                    "bitrate": round(bitrate, 1) if bitrate else None
+                    "duration": probe["duration"],
+                    "bitrate": probe["bitrate"]
                 }
             elif f.lower().endswith((".mp4", ".webm")):
+                probe = {"width": None, "height": None, "duration": None, "bitrate": None}
+                if result["media_probed"]:
+                    # Compressed members can only seek forward by decompressing, so
+                    # don't go looking for headers stored behind the media data.
+                    max_skip = None if is_random_access(info) else VIDEO_SCAN_LIMIT
+                    with memory.track("analyze.video"), open_member(z, info) as video:
+                        probe = probe_video(video, info.file_size, max_skip)
+                
                 result["video"] = {
                     "filename": f,
-                    "size_bytes": info.file_size
+                    "size_bytes": info.file_size,
+                    **probe
                 }
             elif f.startswith("hitsounds/") and not f.endswith("/"):
                 result["hitsounds"].append({
@@ -107,40 +305,4 @@ def analyze_beatmap(zip_bytes):
     return result
 
 def calculate_drain_time(difficulty):
-    data = difficulty.get("data", {})
-    notes = data.get("notes", [])
-    typing_sections = data.get("typingSections", [])
-    
-    if not notes and not typing_sections:
-        return 0
-    
-    event_times = []
-    
-    for note in notes:
-        if note.get("type") == "hold":
-            event_times.append(note.get("startTime", 0))
-            event_times.append(note.get("endTime", 0))
-        else:
-            event_times.append(note.get("time", 0))
-
-    event_times.sort()
-    
-    drain_length = 0
-    if len(event_times) >= 2:
-        first_event = event_times[0]
-        last_event = event_times[-1]
-        drain_length = last_event - first_event
-        
-        gap_threshold = 5000
-        
-        for i in range(1, len(event_times)):
-            gap = event_times[i] - event_times[i - 1]
-            if gap >= gap_threshold:
-                drain_length -= gap
-    
-    for section in typing_sections:
-        start = section.get("startTime", 0)
-        end = section.get("endTime", 0)
-        drain_length += end - start
-    
-    return max(drain_length, 0)
+    return ParsedDifficulty(difficulty).drain_time
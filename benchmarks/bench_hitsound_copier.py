@@ -0,0 +1,93 @@
+"""
+Compare merged hitsound matching in copy_hitsounds against the previous linear scan.
+
+    python -m benchmarks.bench_hitsound_copier --difficulties 6 --notes 10000
+"""
+import argparse
+import time
+import zipfile
+from io import BytesIO
+
+from benchmarks.synthetic import MapsetSpec, build_mapset as build_synthetic_mapset
+from tools import hitsound_copier
+from tools.hitsound_copier import TIME_TOLERANCE_MS, copy_hitsounds
+
+
+def linear_matches(events, times, tolerance=TIME_TOLERANCE_MS):
+    """The matching used before: a scan over every event for each time."""
+    return [_linear_closest(events, time, tolerance) for time in times]
+
+
+def _linear_closest(events, target_time, tolerance):
+    if not events or target_time is None:
+        return None
+
+    closest = None
+    closest_diff = float('inf')
+
+    for time, sounds, volume, sample_set, hold_data in events:
+        if time is None:
+            continue
+        diff = abs(time - target_time)
+        if diff <= tolerance and diff < closest_diff:
+            closest = (sounds, volume, sample_set, hold_data)
+            closest_diff = diff
+
+    return closest
+
+
+def build_mapset(difficulty_count, note_count, seed=1):
+    spec = MapsetSpec(
+        difficulties=difficulty_count,
+        notes=note_count,
+        typing_sections=0,
+        background=None,
+        audio_seconds=0,
+        seed=seed
+    )
+    return BytesIO(build_synthetic_mapset(spec))
+
+
+def _contents(output):
+    with zipfile.ZipFile(output) as z:
+        return {name: z.read(name) for name in z.namelist()}
+
+
+def _run(mapset):
+    mapset.seek(0)
+    start = time.perf_counter()
+    output, stats = copy_hitsounds(mapset, "Diff 0")
+    return time.perf_counter() - start, _contents(output), stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--difficulties", type=int, default=6)
+    parser.add_argument("--notes", type=int, default=10000)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    mapset = build_mapset(args.difficulties, args.notes)
+
+    merged_time, merged_output, stats = _run(mapset)
+    print(f"merged:  {merged_time * 1000:.1f} ms ({stats['modified_notes']} notes modified)")
+
+    if args.skip_legacy:
+        return
+
+    match_events = hitsound_copier._match_events
+    hitsound_copier._match_events = linear_matches
+    try:
+        legacy_time, legacy_output, _ = _run(mapset)
+    finally:
+        hitsound_copier._match_events = match_events
+
+    print(f"legacy:  {legacy_time * 1000:.1f} ms")
+    print(f"speedup: {legacy_time / merged_time:.0f}x")
+
+    if legacy_output != merged_output:
+        raise SystemExit("Outputs differ between implementations")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Compare the vectorized key counter against the previous per-timestamp rescan,
+both for speed and for identical results (reported intervals and messages)
+on overloaded charts and their edge cases.
+
+    python -m benchmarks.bench_keys_check --notes 20000
+"""
+import argparse
+import random
+import time
+
+from apis.rhythmtyper import format_timestamp
+from checks.base import CheckResult, CheckStatus
+from benchmarks.synthetic import build_difficulty
+from checks.difficulty.keys_check import MAX_KEYS, check_key_count, find_overloaded_intervals
+from utils.parsed_difficulty import ParsedDifficulty
+
+
+def legacy_key_counts(difficulty):
+    """The previous rescan: (timestamp, keys) for every sampled timestamp, in order."""
+    notes = difficulty.get("data", {}).get("notes", [])
+    taps = [n for n in notes if n.get("type") == "tap"]
+    holds = [n for n in notes if n.get("type") == "hold"]
+
+    timestamps = set()
+    for n in taps:
+        timestamps.add(n.get("time", 0))
+    for n in holds:
+        timestamps.add(n.get("startTime", 0))
+        timestamps.add(n.get("endTime", 0))
+
+    counts = []
+    for t in sorted(timestamps):
+        count = 0
+        count += sum(1 for n in taps if n.get("time") == t)
+        count += sum(1 for n in holds if n.get("startTime", 0) <= t <= n.get("endTime", 0))
+        counts.append((t, count))
+    return counts
+
+
+def legacy_overloaded_intervals(difficulty, limit=MAX_KEYS):
+    intervals = []
+    run = None
+    for t, count in legacy_key_counts(difficulty):
+        if count > limit:
+            run = [t, t, count] if run is None else [run[0], t, max(run[2], count)]
+        elif run is not None:
+            intervals.append(tuple(run))
+            run = None
+    if run is not None:
+        intervals.append(tuple(run))
+    return intervals
+
+
+def legacy_check_key_count(difficulty):
+    """The previous rescan, reporting every overloaded run in the current message format."""
+    if not difficulty.get("data", {}).get("notes"):
+        return CheckResult(CheckStatus.PASS, "Keys")
+
+    intervals = legacy_overloaded_intervals(difficulty)
+    if not intervals:
+        return CheckResult(CheckStatus.PASS, "Keys")
+
+    places = [
+        f"{format_timestamp(start)} ({peak} keys)" if start == end
+        else f"{format_timestamp(start)} - {format_timestamp(end)} (up to {peak} keys)"
+        for start, end, peak in intervals
+    ]
+    if len(places) == 1:
+        message = f"More than {MAX_KEYS} keys pressed at {places[0]}."
+    else:
+        message = f"More than {MAX_KEYS} keys pressed in {len(places)} places: {', '.join(places[:5])}"
+        if len(places) > 5:
+            message += ", etc."
+    return CheckResult(CheckStatus.FAIL, "Keys", message)
+
+
+def build_chart(note_count, hold_ratio=0.3, seed=1, chord_every=0):
+    """A synthetic chart, with a chord of MAX_KEYS + 1 taps after every `chord_every` notes."""
+    data = build_difficulty(note_count, hold_ratio, seed, hitsound_density=0)
+    if chord_every:
+        chords = []
+        for note in data["notes"][::chord_every]:
+            t = note.get("time", note.get("startTime"))
+            chords.extend({"type": "tap", "time": t} for _ in range(MAX_KEYS + 1))
+        data["notes"].extend(chords)
+    return {"filename": "bench.json", "data": data}
+
+
+def _tap(time=None):
+    return {"type": "tap"} if time is None else {"type": "tap", "time": time}
+
+
+def _hold(start, end):
+    return {"type": "hold", "startTime": start, "endTime": end}
+
+
+def edge_case_charts():
+    """Named overloaded (and nearly overloaded) charts around the counting rules."""
+    over = MAX_KEYS + 1
+    return {
+        "tap chord": [_tap(1000) for _ in range(over)],
+        "chord at the limit": [_tap(1000) for _ in range(MAX_KEYS)],
+        "stacked holds": [_hold(1000, 3000) for _ in range(over)],
+        "zero-length holds": [_hold(2000, 2000) for _ in range(over)],
+        "holds sharing an edge": (
+            [_hold(1000, 2000) for _ in range(6)] + [_hold(2000, 3000) for _ in range(5)]
+        ),
+        "holds and taps on an edge": [_hold(500, 1500) for _ in range(MAX_KEYS)] + [_tap(1500)],
+        "taps without a time": [_tap() for _ in range(over)] + [_hold(0, 500) for _ in range(MAX_KEYS)],
+        "timed taps at 0": [_tap() for _ in range(over)] + [_tap(0)] + [_hold(0, 500) for _ in range(MAX_KEYS)],
+        "inverted holds": [_hold(3000, 1000) for _ in range(over)] + [_tap(2000) for _ in range(MAX_KEYS)],
+        "inverted and normal holds": (
+            [_hold(3000, 1000) for _ in range(5)] + [_hold(1000, 3000) for _ in range(over)]
+        ),
+        "many places": (
+            [_tap(t * 1000) for t in range(8) for _ in range(over)]
+            + [_tap(t * 1000 + 500) for t in range(8)]
+        ),
+        "mixed run": (
+            [_hold(1000, 4000) for _ in range(9)]
+            + [_tap(t) for t in (1000, 1000, 2000, 2000, 2000, 4000, 4000)]
+            + [_hold(2000, 2000), _hold(3000, 3000), _hold(3000, 3000)]
+        ),
+    }
+
+
+def random_overloaded_chart(rng, notes=80):
+    """Dense random charts on a coarse grid, so timestamps collide and often overload."""
+    chart = []
+    for _ in range(notes):
+        t = rng.randrange(0, 40) * 50
+        roll = rng.random()
+        if roll < 0.05:
+            chart.append(_tap())
+        elif roll < 0.5:
+            chart.append(_tap(t))
+        elif roll < 0.6:
+            chart.append(_hold(t, t))
+        elif roll < 0.7:
+            chart.append(_hold(t, t - rng.randrange(1, 10) * 50))
+        else:
+            chart.append(_hold(t, t + rng.randrange(1, 20) * 50))
+    return chart
+
+
+def compare(name, notes):
+    """Raise SystemExit if the implementations disagree on the chart."""
+    difficulty = {"filename": f"{name}.json", "data": {"notes": notes}}
+    parsed = ParsedDifficulty(difficulty)
+    legacy_intervals = legacy_overloaded_intervals(difficulty)
+    intervals = find_overloaded_intervals(parsed)
+    legacy_result = legacy_check_key_count(difficulty)
+    result = check_key_count(parsed)
+    if (
+        legacy_intervals != intervals
+        or (legacy_result.status, legacy_result.message) != (result.status, result.message)
+    ):
+        raise SystemExit(
+            f"Results differ on {name}:\n"
+            f"  legacy:     {legacy_intervals} {legacy_result.status.value} {legacy_result.message!r}\n"
+            f"  vectorized: {intervals} {result.status.value} {result.message!r}"
+        )
+    return result
+
+
+def check_equivalence(random_charts, seed=1):
+    failed = 0
+    for name, notes in edge_case_charts().items():
+        failed += compare(name, notes).status == CheckStatus.FAIL
+    rng = random.Random(seed)
+    for i in range(random_charts):
+        failed += compare(f"random chart {i}", random_overloaded_chart(rng)).status == CheckStatus.FAIL
+    total = len(edge_case_charts()) + random_charts
+    print(f"identical results on {total} charts ({failed} overloaded)")
+
+
+def _time(func, difficulty):
+    start = time.perf_counter()
+    result = func(difficulty)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--notes", type=int, default=20000)
+    parser.add_argument("--hold-ratio", type=float, default=0.3)
+    parser.add_argument("--chord-every", type=int, default=1000, help="add an overloaded chord after every N notes (0 for none)")
+    parser.add_argument("--random-charts", type=int, default=500, help="random overloaded charts to compare")
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    if not args.skip_legacy:
+        check_equivalence(args.random_charts)
+
+    difficulty = build_chart(args.notes, args.hold_ratio, chord_every=args.chord_every)
+
+    # Parsing is included, as every check run pays for it once
+    sweep_time, sweep_result = _time(lambda d: check_key_count(ParsedDifficulty(d)), difficulty)
+    print(f"vectorized: {sweep_time * 1000:.1f} ms ({sweep_result.status.value})")
+
+    if args.skip_legacy:
+        return
+
+    legacy_time, legacy_result = _time(legacy_check_key_count, difficulty)
+    print(f"legacy:     {legacy_time * 1000:.1f} ms ({legacy_result.status.value})")
+    print(f"speedup:    {legacy_time / sweep_time:.0f}x")
+
+    if (legacy_result.status, legacy_result.message) != (sweep_result.status, sweep_result.message):
+        raise SystemExit(
+            f"Results differ between implementations:\n"
+            f"  legacy:     {legacy_result.message!r}\n  vectorized: {sweep_result.message!r}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Drive the cogs with many simulated users against a local RhythmTyper stand-in.
+
+    python -m benchmarks.loadtest --users 300 --maps 20 --latency 0.05
+
+/verifymap (by URL and by attachment), /map and /copyhitsounds are called
+with fake Interaction and Attachment objects, so nothing talks to Discord.
+Archive downloads, attachment downloads and getBeatmaps lookups all go to a
+StandIn serving synthetic mapsets. Reports p50/p95/p99 latency to the first
+reply and to the last message of each command, plus throughput.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from collections import Counter, defaultdict
+from types import SimpleNamespace
+
+import config
+from apis.rhythmtyper import RhythmTyperClient
+from benchmarks.stand_in import StandIn
+from benchmarks.synthetic import MapsetSpec, build_mapset
+from cogs.map_tools import MapTools
+from cogs.map_verifier import MapVerifier
+from pipeline import JobExecutor, JobScheduler
+
+# First-reply titles that mean the command didn't do its job
+FAILURE_TITLES = {
+    "Bot Busy", "Map Too Large", "Invalid Map File", "Invalid URL", "Not Found", "Error",
+    "Verification Error", "Hitsound Copy Failed"
+}
+
+DEFAULT_MIX = "verify_url=4,verify_file=2,map=3,copyhitsounds=1"
+
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+
+    def __str__(self):
+        return f"loadtest#{self.id}"
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def defer(self, **kwargs):
+        pass
+
+    async def send_message(self, **kwargs):
+        self.interaction.record(kwargs)
+
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def send(self, **kwargs):
+        self.interaction.record(kwargs)
+
+
+class FakeInteraction:
+    """The parts of discord.Interaction the cogs use, recording when each message is sent."""
+
+    def __init__(self, user_id, guild_id):
+        self.user = FakeUser(user_id)
+        self.guild_id = guild_id
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+        self.messages = []  # (perf_counter time, embed title)
+        self.edits = 0
+
+    def record(self, kwargs):
+        embed = kwargs.get("embed")
+        self.messages.append((time.perf_counter(), embed.title if embed else None))
+
+    async def edit_original_response(self, **kwargs):
+        self.edits += 1
+
+
+class FakeAttachment:
+    """A discord.Attachment whose CDN URL points at the stand-in's storage."""
+
+    def __init__(self, base_url, map_id, size):
+        self.filename = f"{map_id}.rtm"
+        self.url = f"{base_url}/beatmaps/{map_id}/{map_id}.rtm"
+        self.size = size
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("verify_url", "verify_file", "map", "copyhitsounds"):
+            raise argparse.ArgumentTypeError(f"unknown command {name!r}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class LoadTest:
+    def __init__(self, verifier, tools, base_url, archives, guilds):
+        self.verifier = verifier
+        self.tools = tools
+        self.base_url = base_url
+        self.archives = archives
+        self.map_ids = list(archives)
+        self.guilds = guilds
+        self.samples = defaultdict(list)  # command -> [(first_reply_s, done_s)]
+        self.outcomes = defaultdict(Counter)
+
+    async def call(self, command, interaction, map_id):
+        url = f"https://rhythmtyper.net/beatmap/{map_id}"
+        if command == "verify_url":
+            await MapVerifier.verify.callback(self.verifier, interaction, url=url)
+        elif command == "verify_file":
+            attachment = FakeAttachment(self.base_url, map_id, len(self.archives[map_id]))
+            await MapVerifier.verify.callback(self.verifier, interaction, file=attachment)
+        elif command == "map":
+            await MapTools.map_info.callback(self.tools, interaction, url=url)
+        else:
+            attachment = FakeAttachment(self.base_url, map_id, len(self.archives[map_id]))
+            await MapTools.hitsounds_copy.callback(self.tools, interaction, file=attachment, source_difficulty="Diff 0")
+
+    async def user(self, user_id, commands, rng, think_time):
+        guild_id = user_id % self.guilds
+        for command in commands:
+            if think_time:
+                await asyncio.sleep(rng.uniform(0, think_time))
+            interaction = FakeInteraction(user_id, guild_id)
+            start = time.perf_counter()
+            try:
+                await self.call(command, interaction, rng.choice(self.map_ids))
+            except Exception as e:
+                self.outcomes[command][f"raised {type(e).__name__}"] += 1
+                continue
+            done = time.perf_counter()
+
+            first = interaction.messages[0] if interaction.messages else (done, None)
+            self.samples[command].append((first[0] - start, done - start))
+            self.outcomes[command][first[1] if first[1] in FAILURE_TITLES else "ok"] += 1
+
+
+def report(load, elapsed):
+    total = sum(len(samples) for samples in load.samples.values())
+    print(f"\n{total} command(s) in {elapsed:.1f}s: {total / elapsed:.1f} commands/s")
+
+    print(f"\n{'command':<16}{'count':>7}  {'first reply ms (p50/p95/p99)':>30}  {'done ms (p50/p95/p99)':>26}")
+    for command, samples in sorted(load.samples.items()):
+        first = [s[0] * 1000 for s in samples]
+        done = [s[1] * 1000 for s in samples]
+        first_text = "/".join(f"{percentile(first, p):.0f}" for p in (50, 95, 99))
+        done_text = "/".join(f"{percentile(done, p):.0f}" for p in (50, 95, 99))
+        print(f"{command:<16}{len(samples):>7}  {first_text:>30}  {done_text:>26}")
+
+    print("\nOutcomes:")
+    for command, outcomes in sorted(load.outcomes.items()):
+        summary = ", ".join(f"{count} {outcome}" for outcome, count in outcomes.most_common())
+        print(f"  {command}: {summary}")
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    spec = MapsetSpec(difficulties=args.difficulties, notes=args.notes, audio_seconds=args.audio_seconds)
+    archives = {
+        f"load{i}": build_mapset(spec.scaled(seed=args.seed + i))
+        for i in range(args.maps)
+    }
+    stand_in = StandIn(archives, latency=args.latency)
+    base_url = await stand_in.start()
+
+    weights = args.mix
+    names = list(weights)
+    plans = [
+        rng.choices(names, weights=[weights[n] for n in names], k=args.requests)
+        for _ in range(args.users)
+    ]
+
+    async with RhythmTyperClient(api_url=f"{base_url}/api", storage_url=base_url) as client, JobExecutor() as executor:
+        bot = SimpleNamespace(rhythmtyper=client, executor=executor, scheduler=JobScheduler())
+        load = LoadTest(MapVerifier(bot), MapTools(bot), base_url, archives, args.guilds)
+        print(
+            f"{args.users} user(s) x {args.requests} command(s), {args.maps} map(s) of "
+            f"{args.difficulties}x{args.notes} notes, {args.latency * 1000:.0f} ms backend latency"
+        )
+
+        start = time.perf_counter()
+        try:
+            await asyncio.gather(*(
+                load.user(user_id, plan, random.Random(args.seed * 7919 + user_id), args.think_time)
+                for user_id, plan in enumerate(plans, 1)
+            ))
+        finally:
+            await stand_in.close()
+        elapsed = time.perf_counter() - start
+
+    report(load, elapsed)
+    print(f"\nStand-in: {stand_in.stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=200, help="concurrent simulated users")
+    parser.add_argument("--requests", type=int, default=1, help="commands each user runs one after another")
+    parser.add_argument("--guilds", type=int, default=5)
+    parser.add_argument("--maps", type=int, default=20, help="distinct mapsets served")
+    parser.add_argument("--difficulties", type=int, default=4)
+    parser.add_argument("--notes", type=int, default=1500)
+    parser.add_argument("--audio-seconds", type=float, default=30)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every stand-in response")
+    parser.add_argument("--think-time", type=float, default=0.0, help="max random pause before each command, in seconds")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help=f"command weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-cache", action="store_true", help="disable the check result cache in the workers")
+    args = parser.parse_args()
+
+    if args.no_cache:
+        # Worker processes read config from the environment when they start
+        os.environ["CHECK_CACHE_MAX_ENTRIES"] = "0"
+        config.CHECK_CACHE_MAX_ENTRIES = 0
+
+    # The verifier writes its last result into the working directory
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
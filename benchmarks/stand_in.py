@@ -0,0 +1,177 @@
+"""
+Local stand-in for the RhythmTyper getBeatmaps API and archive storage.
+
+    python -m benchmarks.stand_in path/to/maps --port 8080 --latency 0.05
+
+Every <map_id>.rtm in the directory is served at /beatmaps/<map_id>/<map_id>.rtm
+(with Range, ETag and If-None-Match support) and described at
+/api/getBeatmaps?mapsetId=<map_id>. Point the bot at it with
+RT_API_URL=http://127.0.0.1:8080/api and RT_STORAGE_URL=http://127.0.0.1:8080.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import zipfile
+from io import BytesIO
+
+from aiohttp import web
+
+RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+def describe_archive(map_id, data):
+    """Build a getBeatmaps entry with the fields /map reads from an archive's JSON."""
+    with zipfile.ZipFile(BytesIO(data)) as z:
+        meta = json.loads(z.read("meta.json"))
+        difficulties = [
+            json.loads(z.read(name)) for name in z.namelist()
+            if name.endswith(".json") and name != "meta.json"
+        ]
+
+    entries = []
+    for diff in difficulties:
+        notes = diff.get("notes", [])
+        times = [n.get("endTime", n.get("time", 0)) for n in notes]
+        entries.append({
+            "name": diff.get("name", "Unknown"),
+            "starRating": diff.get("starRating", 0),
+            "overallDifficulty": diff.get("overallDifficulty", 0),
+            "length": (max(times) / 1000) if times else 0,
+            "noteCount": sum(1 for n in notes if n.get("type") != "hold"),
+            "holdCount": sum(1 for n in notes if n.get("type") == "hold")
+        })
+
+    return {
+        "id": map_id,
+        "songName": meta.get("songName", "Unknown"),
+        "artistName": meta.get("artistName", "Unknown"),
+        "mapper": meta.get("mapper", "Unknown"),
+        "bpm": meta.get("bpm", 0),
+        "status": "pending",
+        "backgroundImageUrl": "",
+        "playCount": 0,
+        "lastUpdatedAt": {"_seconds": 0},
+        "difficulties": entries or [{"name": "Unknown", "length": 0}]
+    }
+
+
+class StandIn:
+    """
+    aiohttp app serving in-memory archives. `latency` (seconds) is added to
+    every response and `ranges=False` makes storage ignore Range headers.
+    """
+
+    def __init__(self, archives, latency=0.0, ranges=True):
+        self.archives = dict(archives)
+        self.latency = latency
+        self.ranges = ranges
+        self.stats = {"metadata_requests": 0, "archive_requests": 0, "archive_bytes": 0}
+        self._etags = {map_id: f'"{hashlib.sha1(data).hexdigest()}"' for map_id, data in self.archives.items()}
+        self._metadata = {}
+
+        self.app = web.Application()
+        self.app.router.add_get("/api/getBeatmaps", self.get_beatmaps)
+        self.app.router.add_get("/beatmaps/{map_id}/{filename}", self.get_archive)
+        self._runner = None
+
+    async def _delay(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def get_beatmaps(self, request):
+        self.stats["metadata_requests"] += 1
+        await self._delay()
+
+        map_id = request.query.get("mapsetId")
+        if map_id not in self.archives:
+            return web.Response(status=403)
+        if map_id not in self._metadata:
+            self._metadata[map_id] = describe_archive(map_id, self.archives[map_id])
+        return web.json_response({"beatmaps": [self._metadata[map_id]]})
+
+    async def get_archive(self, request):
+        self.stats["archive_requests"] += 1
+        await self._delay()
+
+        map_id = request.match_info["map_id"]
+        data = self.archives.get(map_id)
+        if data is None or request.match_info["filename"] != f"{map_id}.rtm":
+            return web.Response(status=403)
+
+        etag = self._etags[map_id]
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+
+        match = RANGE_RE.fullmatch(request.headers.get("Range", "")) if self.ranges else None
+        if match and (match.group(1) or match.group(2)):
+            size = len(data)
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            else:
+                start = max(size - int(match.group(2)), 0)
+                end = size - 1
+            if start >= size or start > end:
+                return web.Response(status=416, headers={"Content-Range": f"bytes */{size}"})
+
+            body = data[start:end + 1]
+            self.stats["archive_bytes"] += len(body)
+            return web.Response(status=206, body=body, headers={
+                "ETag": etag,
+                "Content-Range": f"bytes {start}-{end}/{size}",
+                "Accept-Ranges": "bytes"
+            })
+
+        self.stats["archive_bytes"] += len(data)
+        return web.Response(body=data, headers={"ETag": etag})
+
+    async def start(self, host="127.0.0.1", port=0):
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        return f"http://{host}:{port}"
+
+    async def close(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def load_directory(directory):
+    archives = {}
+    for filename in os.listdir(directory):
+        if filename.endswith(".rtm"):
+            with open(os.path.join(directory, filename), "rb") as f:
+                archives[filename[:-4]] = f.read()
+    return archives
+
+
+async def _serve(args):
+    stand_in = StandIn(load_directory(args.directory), latency=args.latency, ranges=not args.no_range)
+    base_url = await stand_in.start(args.host, args.port)
+    print(f"Serving {len(stand_in.archives)} map(s) at {base_url}")
+    print(f"RT_API_URL={base_url}/api")
+    print(f"RT_STORAGE_URL={base_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await stand_in.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("directory")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--no-range", action="store_true", help="ignore Range headers")
+    asyncio.run(_serve(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Time and peak memory of every verification stage across mapset sizes.
+
+    python -m benchmarks.suite --notes 500,2000,8000 --difficulties 4
+    python -m benchmarks.suite --save benchmarks/baselines/reference.json
+    python -m benchmarks.suite --compare benchmarks/baselines/reference.json
+
+Stages are analyze_beatmap, parsing, every registered check (difficulty
+checks summed over all difficulties), calculate_drain_time and
+copy_hitsounds. Times are the best of --repeat runs; peak memory comes from
+one extra run under tracemalloc. Baselines only compare meaningfully on the
+machine that recorded them.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict
+from io import BytesIO
+
+from apis.rhythmtyper import analyze_beatmap, calculate_drain_time
+from benchmarks.synthetic import MapsetSpec, build_mapset
+from checks import DIFFICULTY_CHECKS, MAPSET_CHECKS, parse_difficulties
+from checks.registry import run_check
+from tools.hitsound_copier import copy_hitsounds
+
+# Differences below these are noise, whatever the ratio
+MIN_TIME_DELTA_MS = 1.0
+MIN_MEMORY_DELTA_KB = 64
+
+
+def _measure(func, setup, repeat):
+    """Best time of `repeat` runs in ms, then the tracemalloc peak of one more in KB."""
+    best = float("inf")
+    for _ in range(repeat):
+        args = setup()
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+
+    args = setup()
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"ms": round(best * 1000, 3), "peak_kb": round(peak / 1024, 1)}
+
+
+def _stages(archive):
+    result = analyze_beatmap(BytesIO(archive))
+
+    # Checks get freshly parsed difficulties, so each pays for the values it
+    # reads first instead of whichever check happened to run before it
+    def parsed():
+        return (parse_difficulties(result),)
+
+    stages = {
+        "analyze": (lambda a: analyze_beatmap(BytesIO(a)), lambda: (archive,)),
+        "parse": (parse_difficulties, lambda: (result,)),
+    }
+    for check in MAPSET_CHECKS:
+        stages[f"check:{check.name}"] = (lambda d, c=check: run_check(c, result, d), parsed)
+    for check in DIFFICULTY_CHECKS:
+        stages[f"check:{check.name}"] = (lambda d, c=check: [run_check(c, diff) for diff in d], parsed)
+    stages["drain_time"] = (
+        lambda diffs: [calculate_drain_time(diff) for diff in diffs],
+        lambda: (result["difficulties"],)
+    )
+    stages["copy_hitsounds"] = (lambda a: copy_hitsounds(BytesIO(a), "Diff 0"), lambda: (archive,))
+    return stages
+
+
+def run_suite(base_spec, note_counts, difficulty_counts, repeat):
+    results = {}
+    for difficulties in difficulty_counts:
+        for notes in note_counts:
+            spec = base_spec.scaled(difficulties=difficulties, notes=notes)
+            size = f"{difficulties}x{notes}"
+            archive = build_mapset(spec)
+            print(f"{size}: {len(archive) / 1024:.0f} KB archive", file=sys.stderr)
+
+            results[size] = {
+                stage: _measure(func, setup, repeat)
+                for stage, (func, setup) in _stages(archive).items()
+            }
+    return results
+
+
+def print_results(results):
+    for size, stages in results.items():
+        print(f"\n{size} (difficulties x notes)")
+        print(f"  {'stage':<28}{'time ms':>12}{'peak KB':>12}")
+        for stage, values in stages.items():
+            print(f"  {stage:<28}{values['ms']:>12.2f}{values['peak_kb']:>12.1f}")
+
+
+def compare(results, baseline, threshold):
+    """Return a line for every stage that got slower or hungrier than the baseline allows."""
+    regressions = []
+    for size, stages in results.items():
+        for stage, values in stages.items():
+            before = baseline.get(size, {}).get(stage)
+            if before is None:
+                continue
+            for key, unit, min_delta in (("ms", "ms", MIN_TIME_DELTA_MS), ("peak_kb", "KB", MIN_MEMORY_DELTA_KB)):
+                old, new = before[key], values[key]
+                if new - old > min_delta and new > old * (1 + threshold):
+                    regressions.append(f"{size} {stage}: {old:.2f} -> {new:.2f} {unit} ({new / old:.2f}x)")
+    return regressions
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--notes", type=_int_list, default=[500, 2000, 8000], help="comma-separated note counts")
+    parser.add_argument("--difficulties", type=_int_list, default=[4], help="comma-separated difficulty counts")
+    parser.add_argument("--hold-ratio", type=float, default=0.25)
+    parser.add_argument("--typing-sections", type=int, default=8)
+    parser.add_argument("--hitsound-density", type=float, default=0.5)
+    parser.add_argument("--background-kb", type=int, default=512)
+    parser.add_argument("--audio-seconds", type=float, default=30)
+    parser.add_argument("--video-kb", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save", metavar="PATH", help="write the results as a baseline")
+    parser.add_argument("--compare", metavar="PATH", help="fail if any stage regressed against this baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown/growth ratio (default: 0.25)")
+    args = parser.parse_args()
+
+    spec = MapsetSpec(
+        hold_ratio=args.hold_ratio,
+        typing_sections=args.typing_sections,
+        hitsound_density=args.hitsound_density,
+        background_bytes=args.background_kb * 1024,
+        audio_seconds=args.audio_seconds,
+        video_bytes=args.video_kb * 1024
+    )
+    results = run_suite(spec, args.notes, args.difficulties, max(args.repeat, 1))
+    print_results(results)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "spec": asdict(spec),
+                "results": results
+            }, f, indent=2)
+            f.write("\n")
+        print(f"\nSaved baseline to {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("spec") != json.loads(json.dumps(asdict(spec))):
+            print("\nWarning: the baseline was recorded with different mapset settings", file=sys.stderr)
+        regressions = compare(results, baseline["results"], args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.compare}:")
+            for line in regressions:
+                print(f"  {line}")
+            raise SystemExit(1)
+        print(f"\nNo regressions against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
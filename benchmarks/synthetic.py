@@ -0,0 +1,182 @@
+"""
+Deterministic synthetic .rtm mapsets for benchmarks and load tests.
+
+Everything is built in memory from a seed, so the same MapsetSpec always
+produces byte-identical archives.
+"""
+import json
+import random
+import struct
+import zipfile
+import zlib
+from dataclasses import dataclass, replace
+from io import BytesIO
+
+WORDS = ("type", "rhythm", "keys", "faster", "beat", "melody", "night", "light", "dream", "echo")
+
+
+@dataclass(frozen=True)
+class MapsetSpec:
+    difficulties: int = 4
+    notes: int = 2000
+    hold_ratio: float = 0.25
+    typing_sections: int = 8
+    hitsound_density: float = 0.5  # fraction of notes with any hitsound
+    jitter_ms: int = 3  # per-difficulty timing noise, within the checks' tolerance
+    background: tuple = (1920, 1080)  # None for no background
+    background_bytes: int = 512 * 1024  # padded up to this size
+    audio_seconds: float = 30  # 0 for no audio
+    audio_sample_rate: int = 22050
+    video_bytes: int = 0  # 0 for no video
+    seed: int = 1
+
+    def scaled(self, **changes):
+        return replace(self, **changes)
+
+
+def _sounds(rng, density):
+    if rng.random() >= density:
+        return {"hitclap": False, "hitwhistle": False, "hitfinish": False}
+    sounds = {
+        "hitclap": rng.random() < 0.6,
+        "hitwhistle": rng.random() < 0.3,
+        "hitfinish": rng.random() < 0.15
+    }
+    if not any(sounds.values()):
+        sounds["hitclap"] = True
+    return sounds
+
+
+def build_difficulty(note_count, hold_ratio=0.25, seed=1, name="Diff 0", typing_sections=0,
+                     hitsound_density=0.5, jitter_ms=0, timing_seed=None):
+    """
+    Build one difficulty JSON. `timing_seed` fixes the note layout separately
+    from `seed`, so difficulties of one mapset can share a rhythm while their
+    hitsounds and jitter differ.
+    """
+    timing = random.Random(seed if timing_seed is None else timing_seed)
+    rng = random.Random(seed)
+    notes = []
+    t = 1000
+    for _ in range(note_count):
+        t += timing.choice((0, 50, 100, 125, 250))
+        is_hold = timing.random() < hold_ratio
+        length = timing.randint(100, 800)
+        jitter = rng.randint(-jitter_ms, jitter_ms) if jitter_ms else 0
+        if is_hold:
+            notes.append({
+                "type": "hold",
+                "startTime": t + jitter,
+                "endTime": t + jitter + length,
+                "hitsound": {
+                    "sampleSet": "soft",
+                    "start": {"sounds": _sounds(rng, hitsound_density), "volume": 80},
+                    "hold": {"volume": rng.choice((30, 50, 80))},
+                    "end": {"sounds": _sounds(rng, hitsound_density), "volume": 80}
+                }
+            })
+        else:
+            notes.append({
+                "type": "tap",
+                "time": t + jitter,
+                "hitsound": {"sampleSet": "normal", "sounds": _sounds(rng, hitsound_density), "volume": 70}
+            })
+
+    sections = []
+    if typing_sections and notes:
+        span = max(t - 1000, 1) / typing_sections
+        for i in range(typing_sections):
+            start = int(1000 + i * span)
+            text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 8)))
+            sections.append({"startTime": start, "endTime": start + int(span * 0.8), "text": text})
+
+    return {
+        "name": name,
+        "overallDifficulty": rng.choice((3, 5, 7)),
+        "notes": notes,
+        "typingSections": sections
+    }
+
+
+def build_png(width, height, size_bytes=0, seed=1):
+    """Solid-colour PNG, padded with an ancillary chunk of noise up to size_bytes."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    rows = (b"\x00" + b"\x20\x40\x60" * width) * height
+    png = (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(rows, 1))
+    )
+    padding = size_bytes - len(png) - 24
+    if padding > 0:
+        png += chunk(b"prVt", random.Random(seed).randbytes(padding))
+    return png + chunk(b"IEND", b"")
+
+
+def build_wav(seconds, sample_rate=22050, seed=1):
+    """Mono 16-bit PCM WAV of noise (incompressible, like real audio)."""
+    data = random.Random(seed).randbytes(int(seconds * sample_rate) * 2)
+    header = struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + len(data), b"WAVE",
+        b"fmt ", 16, 1, 1, sample_rate, sample_rate * 2, 2, 16,
+        b"data", len(data)
+    )
+    return header + data
+
+
+def build_mp4(size_bytes, width=1920, height=1080, seconds=120, seed=1):
+    """MP4 with a minimal moov (mvhd + one video trak) ahead of an mdat of noise."""
+    def box(kind, payload):
+        return struct.pack(">I", 8 + len(payload)) + kind + payload
+
+    timescale = 1000
+    mvhd = box(b"mvhd", struct.pack(">B3xIIII", 0, 0, 0, timescale, int(seconds * timescale)) + bytes(80))
+    tkhd = box(b"tkhd", struct.pack(">B3x", 0) + bytes(72) + struct.pack(">II", width << 16, height << 16))
+    hdlr = box(b"hdlr", bytes(8) + b"vide" + bytes(12) + b"video\x00")
+    moov = box(b"moov", mvhd + box(b"trak", tkhd + box(b"mdia", hdlr)))
+    head = box(b"ftyp", b"isom" + struct.pack(">I", 512) + b"isomiso2mp41") + moov
+    mdat_size = max(size_bytes - len(head) - 8, 0)
+    return head + box(b"mdat", random.Random(seed).randbytes(mdat_size))
+
+
+def build_mapset(spec=MapsetSpec()):
+    """Build a complete .rtm archive for `spec` and return its bytes."""
+    rng = random.Random(spec.seed)
+    buffer = BytesIO()
+
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("meta.json", json.dumps({
+            "songName": f"Synthetic {spec.seed}",
+            "artistName": "Benchmark",
+            "mapper": "bench",
+            "bpm": 180,
+            "tags": "electronic synthetic benchmark",
+            "previewTime": 30000
+        }))
+
+        for d in range(spec.difficulties):
+            difficulty = build_difficulty(
+                spec.notes,
+                spec.hold_ratio,
+                seed=rng.randrange(1 << 30),
+                name=f"Diff {d}",
+                typing_sections=spec.typing_sections,
+                hitsound_density=spec.hitsound_density,
+                jitter_ms=spec.jitter_ms,
+                timing_seed=spec.seed
+            )
+            z.writestr(f"diff{d}.json", json.dumps(difficulty))
+
+        # Media is stored like most mapping tools do, since it doesn't compress
+        if spec.background:
+            width, height = spec.background
+            z.writestr("bg.png", build_png(width, height, spec.background_bytes, spec.seed), zipfile.ZIP_STORED)
+        if spec.audio_seconds:
+            z.writestr("audio.wav", build_wav(spec.audio_seconds, spec.audio_sample_rate, spec.seed), zipfile.ZIP_STORED)
+        if spec.video_bytes:
+            z.writestr("video.mp4", build_mp4(spec.video_bytes, seed=spec.seed), zipfile.ZIP_STORED)
+
+    return buffer.getvalue()
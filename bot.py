@@ -3,44 +3,52 @@ import asyncio
 import logging
 import discord
 from discord.ext import commands
-from dotenv import load_dotenv
+import config
+from apis.rhythmtyper import RhythmTyperClient
+from apis.archive_cache import ArchiveCache
+from pipeline import JobExecutor, JobScheduler
+from utils.metrics import MetricsServer
 
 log_format = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
 
-logging.basicConfig(
-    level=logging.INFO,
-    format=log_format,
-    handlers=[
-        logging.FileHandler("bot.log", mode="w", encoding="utf-8"),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
-load_dotenv()
 
-intents = discord.Intents.default()
-intents.message_content = True
+def setup_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format=log_format,
+        handlers=[
+            logging.FileHandler("bot.log", mode="w", encoding="utf-8"),
+            logging.StreamHandler()
+        ]
+    )
 
-bot = commands.Bot(
-    command_prefix="!",
-    intents=intents,
-    description="A simple Discord bot with cogs"
-)
 
+def create_bot():
+    intents = discord.Intents.default()
+    intents.message_content = True
 
-@bot.event
-async def on_ready():
-    logger.info(f"Logged in as {bot.user} (ID: {bot.user.id})")
-    logger.info(f"Connected to {len(bot.guilds)} guild(s)")
-    
-    synced = await bot.tree.sync()
-    logger.info(f"Synced {len(synced)} slash command(s)")
-    
-    logger.info("------")
+    bot = commands.Bot(
+        command_prefix="!",
+        intents=intents,
+        description="A simple Discord bot with cogs"
+    )
+
+    @bot.event
+    async def on_ready():
+        logger.info(f"Logged in as {bot.user} (ID: {bot.user.id})")
+        logger.info(f"Connected to {len(bot.guilds)} guild(s)")
+        
+        synced = await bot.tree.sync()
+        logger.info(f"Synced {len(synced)} slash command(s)")
+        
+        logger.info("------")
 
+    return bot
 
-async def load_cogs():
+
+async def load_cogs(bot):
     for filename in os.listdir("./cogs"):
         if filename.endswith(".py") and not filename.startswith("_"):
             cog_name = f"cogs.{filename[:-3]}"
@@ -49,11 +57,31 @@ async def load_cogs():
 
 
 async def main():
-    async with bot:
-        await load_cogs()
-        token = os.getenv("DISCORD_TOKEN")
-        logger.info("Starting bot...")
-        await bot.start(token)
+    # Spawned worker processes import this module too, so nothing that
+    # truncates bot.log or builds the bot may run at import time
+    setup_logging()
+    bot = create_bot()
+
+    archive_cache = None
+    if config.ARCHIVE_CACHE_MAX_BYTES > 0:
+        archive_cache = ArchiveCache(config.ARCHIVE_CACHE_DIR, config.ARCHIVE_CACHE_MAX_BYTES)
+    
+    async with RhythmTyperClient(archive_cache=archive_cache) as rhythmtyper, JobExecutor() as executor, bot:
+        bot.rhythmtyper = rhythmtyper
+        bot.executor = executor
+        bot.scheduler = JobScheduler()
+        metrics_server = MetricsServer()
+        if config.METRICS_PORT:
+            try:
+                await metrics_server.start(config.METRICS_HOST, config.METRICS_PORT)
+            except OSError as e:
+                logger.warning(f"Could not start the metrics endpoint on port {config.METRICS_PORT}: {e}")
+        try:
+            await load_cogs(bot)
+            logger.info("Starting bot...")
+            await bot.start(config.DISCORD_TOKEN)
+        finally:
+            await metrics_server.close()
 
 
 if __name__ == "__main__":
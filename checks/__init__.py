@@ -1,11 +1,23 @@
 from .base import CheckResult, CheckStatus
+from .registry import Check, run_check, run_checks
+from .result_cache import CheckResultCache, default_cache
 from .mapset import MAPSET_CHECKS
 from .difficulty import DIFFICULTY_CHECKS
+from utils.parsed_difficulty import ParsedDifficulty
 
 
-def run_meta_checks(result):
-    return [check(result) for check in MAPSET_CHECKS]
+def parse_difficulties(result):
+    return [ParsedDifficulty(diff) for diff in result.get("difficulties", [])]
 
 
-def run_difficulty_checks(difficulty):
-    return [check(difficulty) for check in DIFFICULTY_CHECKS]
+def run_all_checks(result, difficulties=None, threads=None, cache=None):
+    """
+    Run the registered checks, reusing cached results for unchanged content
+    (the configured cache unless one is passed). Returns
+    (mapset_results, [difficulty_results, ...]).
+    """
+    if difficulties is None:
+        difficulties = parse_difficulties(result)
+    if cache is None:
+        cache = default_cache()
+    return run_checks(result, difficulties, MAPSET_CHECKS, DIFFICULTY_CHECKS, threads, cache)
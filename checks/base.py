@@ -7,6 +7,7 @@ class CheckStatus(Enum):
     WARNING = "warning"
     FAIL = "fail"
     INFO = "info"
+    ERROR = "error"  # the check itself crashed
 
 @dataclass
 class CheckResult:
@@ -14,3 +15,4 @@ class CheckResult:
     name: str
     message: str = ""
     attachment: Optional[tuple[str, str]] = None  # (filename, content)
+    elapsed_ms: Optional[float] = None  # wall time, set by the check runner
@@ -3,12 +3,13 @@ from .od_check import check_od
 from .keys_check import check_key_count
 from .hold_check import check_hold_volume
 from .wpm_check import check_typing_wpm
+from checks.registry import Check, DIFFICULTY, EXPENSIVE
 
 DIFFICULTY_CHECKS = [
-    check_has_notes,
-    check_od,
-    check_key_count,
-    #check_hold_volume,
-    check_typing_wpm,
+    Check(check_has_notes, "Notes", DIFFICULTY),
+    Check(check_od, "OD", DIFFICULTY),
+    Check(check_key_count, "Keys", DIFFICULTY, EXPENSIVE, inputs=("is_hold",)),
+    #Check(check_hold_volume, "Hold", DIFFICULTY, inputs=("is_hold",)),
+    Check(check_typing_wpm, "WPM", DIFFICULTY),
 ]
 
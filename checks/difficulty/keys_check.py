@@ -1,33 +1,83 @@
+import numpy as np
+
 from checks.base import CheckResult, CheckStatus
 from apis.rhythmtyper import format_timestamp
+from utils.parsed_difficulty import NOTE_TAP
+
+MAX_KEYS = 10
+
+
+def key_count_timeline(difficulty):
+    """
+    Return (times, counts) over every tap/hold timestamp in order, where count
+    is the number of taps at that time plus the holds whose inclusive
+    [startTime, endTime] range covers it.
+    """
+    taps = difficulty.start[difficulty.types == NOTE_TAP]
+    hold_starts = np.nan_to_num(difficulty.start[difficulty.is_hold], nan=0.0)
+    hold_ends = np.nan_to_num(difficulty.end[difficulty.is_hold], nan=0.0)
+
+    # Taps without a time sample 0 without being counted. Inverted holds never
+    # cover a timestamp, but their edges are still sampled.
+    times = np.unique(np.concatenate((np.nan_to_num(taps, nan=0.0), hold_starts, hold_ends)))
+
+    taps = np.sort(taps[~np.isnan(taps)])
+    counts = np.searchsorted(taps, times, side="right") - np.searchsorted(taps, times, side="left")
+
+    covering = hold_starts <= hold_ends
+    starts = np.sort(hold_starts[covering])
+    ends = np.sort(hold_ends[covering])
+    # Holds started at or before t, minus those that already ended before t
+    counts += np.searchsorted(starts, times, side="right") - np.searchsorted(ends, times, side="left")
+
+    return times, counts
+
+
+def find_overloaded_intervals(difficulty, limit=MAX_KEYS):
+    """
+    Return (start, end, peak) for every run of consecutive timestamps where more
+    than `limit` keys are held at once.
+    """
+    times, counts = key_count_timeline(difficulty)
+    over = np.concatenate(([0], (counts > limit).astype(np.int8), [0]))
+    edges = np.diff(over)
+    run_starts = np.flatnonzero(edges == 1)
+    run_ends = np.flatnonzero(edges == -1)
+
+    return [
+        (times[start].item(), times[end - 1].item(), int(counts[start:end].max()))
+        for start, end in zip(run_starts, run_ends)
+    ]
+
+
+def _format_interval(start, end, peak):
+    if start == end:
+        return f"{format_timestamp(start)} ({peak} keys)"
+    return f"{format_timestamp(start)} - {format_timestamp(end)} (up to {peak} keys)"
+
 
 def check_key_count(difficulty):
-    notes = difficulty.get("data", {}).get("notes", [])
-    
-    if not notes:
+    if not len(difficulty):
         return CheckResult(CheckStatus.PASS, "Keys")
-    
-    taps = [n for n in notes if n.get("type") == "tap"]
-    holds = [n for n in notes if n.get("type") == "hold"]
-    
-    timestamps = set()
-    for n in taps:
-        timestamps.add(n.get("time", 0))
-    for n in holds:
-        timestamps.add(n.get("startTime", 0))
-        timestamps.add(n.get("endTime", 0))
-    
-    for t in timestamps:
-        count = 0
-        count += sum(1 for n in taps if n.get("time") == t)
-        count += sum(1 for n in holds if n.get("startTime", 0) <= t <= n.get("endTime", 0))
-        
-        if count > 10:
-            return CheckResult(
-                CheckStatus.FAIL,
-                "Keys",
-                f"More than 10 keys pressed at {format_timestamp(t)} ({count} keys)."
-            )
-    
-    return CheckResult(CheckStatus.PASS, "Keys")
 
+    intervals = find_overloaded_intervals(difficulty)
+
+    if not intervals:
+        return CheckResult(CheckStatus.PASS, "Keys")
+
+    if len(intervals) == 1:
+        return CheckResult(
+            CheckStatus.FAIL,
+            "Keys",
+            f"More than {MAX_KEYS} keys pressed at {_format_interval(*intervals[0])}."
+        )
+
+    details = ", ".join(_format_interval(*interval) for interval in intervals[:5])
+    if len(intervals) > 5:
+        details += ", etc."
+
+    return CheckResult(
+        CheckStatus.FAIL,
+        "Keys",
+        f"More than {MAX_KEYS} keys pressed in {len(intervals)} places: {details}"
+    )
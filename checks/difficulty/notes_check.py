@@ -2,9 +2,7 @@ from checks.base import CheckResult, CheckStatus
 
 
 def check_has_notes(difficulty):
-    notes = difficulty.get("data", {}).get("notes", [])
-    
-    if not notes:
+    if not len(difficulty):
         return CheckResult(
             CheckStatus.FAIL,
             "Notes",
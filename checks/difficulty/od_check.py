@@ -2,7 +2,7 @@ from checks.base import CheckResult, CheckStatus
 
 
 def check_od(difficulty):
-    od = difficulty.get("data", {}).get("overallDifficulty", 0)
+    od = difficulty.data.get("overallDifficulty", 0)
     
     if od == 0:
         return CheckResult(
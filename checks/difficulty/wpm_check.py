@@ -12,8 +12,7 @@ def calculate_wpm(text, duration_ms):
 
 
 def check_typing_wpm(difficulty):
-    data = difficulty.get("data", {})
-    typing_sections = data.get("typingSections", [])
+    typing_sections = difficulty.typing_sections
     
     if not typing_sections:
         return CheckResult(CheckStatus.PASS, "WPM")
@@ -5,14 +5,15 @@ from .preview_check import check_preview
 from .gder_check import check_gder_tags
 from .genre_check import check_genre
 from .hs_inconsistency_check import check_hitsound_consistency
+from checks.registry import Check, MAPSET, EXPENSIVE
 
 MAPSET_CHECKS = [
-    check_spread_requirements,
-    check_background,
-    check_tags,
-    check_preview,
-    check_gder_tags,
-    check_genre,
-    check_hitsound_consistency,
+    Check(check_spread_requirements, "Spread", MAPSET, inputs=("drain_time",)),
+    Check(check_background, "BG", MAPSET),
+    Check(check_tags, "Tags", MAPSET),
+    Check(check_preview, "Preview", MAPSET),
+    Check(check_gder_tags, "GDer", MAPSET),
+    Check(check_genre, "Genre", MAPSET),
+    Check(check_hitsound_consistency, "HS Inconsistency", MAPSET, EXPENSIVE, inputs=("sound_events",)),
 ]
 
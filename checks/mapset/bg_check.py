@@ -1,6 +1,6 @@
 from checks.base import CheckResult, CheckStatus
 
-def check_background(result):
+def check_background(result, difficulties):
     background = result.get("background")
     
     if not background:
@@ -9,6 +9,13 @@ def check_background(result):
     width = background.get("width", 0)
     height = background.get("height", 0)
     
+    if width is None or height is None:
+        return CheckResult(
+            CheckStatus.INFO,
+            "BG",
+            "Background size was not checked because the map file is too large to inspect its media."
+        )
+    
     warnings = []
     
     if width > 2560 or height > 1440:
@@ -2,15 +2,14 @@ import re
 from checks.base import CheckResult, CheckStatus
 
 
-def check_gder_tags(result):
+def check_gder_tags(result, difficulties):
     meta = result.get("meta", {})
     tags = meta.get("tags", "").lower().split()
-    difficulties = result.get("difficulties", [])
     
     missing_gders = []
     
     for diff in difficulties:
-        diff_name = diff.get("data", {}).get("name", "")
+        diff_name = diff.data.get("name", "")
         
         # Match word followed by 's or word ending in s followed by '
         # Pattern 1: word's (e.g., "ZABRID'S") -> check "zabrid"
@@ -42,7 +42,7 @@ GENRES = [
 ]
 
 
-def check_genre(result):
+def check_genre(result, difficulties):
     """
     Check if at least one genre tag exists in the tags field.
     """
@@ -1,139 +1,135 @@
+import numpy as np
+
 from checks.base import CheckResult, CheckStatus
 from apis.rhythmtyper import format_timestamp
+from utils.time_index import TimeIndex
 
 TIME_TOLERANCE_MS = 5
 
 
-def _normalize_sounds(sounds):
-    if not sounds:
-        return None
-    active = (
-        sounds.get("hitclap", False),
-        sounds.get("hitwhistle", False),
-        sounds.get("hitfinish", False)
-    )
-    if not any(active):
-        return None
-    return active
+def _extract_note_data(difficulty):
+    times, sounds = difficulty.sound_events
+    all_times = set(times.tolist())
+    audible = sounds > 0
+    # Later events at the same time overwrite earlier ones
+    hitsound_data = dict(zip(times[audible].tolist(), sounds[audible].tolist()))
+    return all_times, hitsound_data
 
 
-def _extract_note_data(notes):
-    all_times = set()
-    hitsound_data = {}
-    
-    for note in notes:
-        hitsound = note.get("hitsound")
-        
-        if note.get("type") == "hold":
-            start_time = note.get("startTime")
-            end_time = note.get("endTime")
-            
-            if start_time is not None:
-                all_times.add(start_time)
-                if hitsound:
-                    start = hitsound.get("start", {})
-                    normalized = _normalize_sounds(start.get("sounds"))
-                    if normalized:
-                        hitsound_data[start_time] = normalized
-            
-            if end_time is not None:
-                all_times.add(end_time)
-                if hitsound:
-                    end = hitsound.get("end", {})
-                    normalized = _normalize_sounds(end.get("sounds"))
-                    if normalized:
-                        hitsound_data[end_time] = normalized
+def _has_near(sorted_times, targets):
+    """For each target, whether any of sorted_times is within TIME_TOLERANCE_MS of it."""
+    lo = np.searchsorted(sorted_times, targets - TIME_TOLERANCE_MS, side="left")
+    hi = np.searchsorted(sorted_times, targets + TIME_TOLERANCE_MS, side="right")
+    return lo < hi
+
+
+def _hitsound_signature(hitsound_data):
+    # Lookups take the earliest added hitsound within tolerance, so the order
+    # hitsounds were added in is part of what a difficulty compares as.
+    return tuple(hitsound_data.items())
+
+
+def _make_group(names, hitsound_data, all_times):
+    return {
+        "names": names,
+        "hitsound_data": hitsound_data,
+        "all_times": np.array(sorted(all_times), dtype=np.float64),
+        "hitsound_times": np.fromiter(hitsound_data, dtype=np.float64, count=len(hitsound_data)),
+        "hitsounds": TimeIndex(hitsound_data.items(), TIME_TOLERANCE_MS)
+    }
+
+
+def _group_difficulties(diff_notes):
+    members = {}
+    for name, difficulty in diff_notes.items():
+        all_times, hitsound_data = _extract_note_data(difficulty)
+        members.setdefault(_hitsound_signature(hitsound_data), []).append((name, hitsound_data, all_times))
+
+    groups = []
+    for group_members in members.values():
+        hitsound_data = group_members[0][1]
+        # Comparing against the union of the members' note times reports every
+        # timestamp where at least one member of the group disagrees.
+        group = _make_group(
+            [name for name, _, _ in group_members],
+            hitsound_data,
+            set().union(*(all_times for _, _, all_times in group_members))
+        )
+        # Identical hitsounds can still disagree with each other when two of
+        # them fall within tolerance, since the earliest added one answers for
+        # both. A group that disagrees with itself is compared member by member.
+        if len(group_members) > 1 and _mismatched_times(group, group):
+            groups.extend(
+                _make_group([name], data, all_times)
+                for name, data, all_times in group_members
+            )
         else:
-            note_time = note.get("time")
-            if note_time is not None:
-                all_times.add(note_time)
-                if hitsound:
-                    normalized = _normalize_sounds(hitsound.get("sounds"))
-                    if normalized:
-                        hitsound_data[note_time] = normalized
-    
-    return all_times, hitsound_data
+            groups.append(group)
 
+    return groups
 
-def _find_closest_match(times_set, target_time, tolerance=TIME_TOLERANCE_MS):
-    if target_time is None:
-        return None
-    for t in times_set:
-        if t is not None and abs(t - target_time) <= tolerance:
-            return t
-    return None
 
+def _format_names(names):
+    quoted = [f"'{name}'" for name in names]
+    if len(quoted) == 1:
+        return quoted[0]
+    return ", ".join(quoted[:-1]) + f" and {quoted[-1]}"
 
-def _get_hitsound_at_time(hitsound_data, target_time, tolerance=TIME_TOLERANCE_MS):
-    for t, sounds in hitsound_data.items():
-        if t is not None and abs(t - target_time) <= tolerance:
-            return sounds
-    return None
 
+def _differs(names):
+    return "differs" if len(names) == 1 else "differ"
 
-def check_hitsound_consistency(result):
-    difficulties = result.get("difficulties", [])
-    
+
+def _mismatched_times(diff1, diff2):
+    mismatched_times = set()
+
+    for diff, other in ((diff1, diff2), (diff2, diff1)):
+        times = diff["hitsound_times"]
+        for t in times[_has_near(other["all_times"], times)].tolist():
+            if diff["hitsound_data"][t] != other["hitsounds"].first_near(t):
+                mismatched_times.add(t)
+
+    return mismatched_times
+
+
+def check_hitsound_consistency(result, difficulties):
     if len(difficulties) < 2:
         return CheckResult(CheckStatus.PASS, "HS Inconsistency")
     
-    diff_data = {}
-    for diff in difficulties:
-        data = diff.get("data", {})
-        name = data.get("name", diff.get("filename", "Unknown"))
-        notes = data.get("notes", [])
-        all_times, hitsound_data = _extract_note_data(notes)
-        diff_data[name] = {
-            "all_times": all_times,
-            "hitsound_data": hitsound_data
-        }
+    diff_notes = {diff.name: diff for diff in difficulties}
     
-    inconsistencies = []
-    diff_names = list(diff_data.keys())
+    groups = _group_difficulties(diff_notes)
     
-    for i, diff1_name in enumerate(diff_names):
-        for diff2_name in diff_names[i + 1:]:
-            diff1 = diff_data[diff1_name]
-            diff2 = diff_data[diff2_name]
-            
-            mismatched_times = set()
-            
-            for t in diff1["hitsound_data"]:
-                if t is None:
-                    continue
-                matched_time = _find_closest_match(diff2["all_times"], t)
-                if matched_time is not None:
-                    diff1_sounds = diff1["hitsound_data"].get(t)
-                    diff2_sounds = _get_hitsound_at_time(diff2["hitsound_data"], t)
-                    if diff1_sounds != diff2_sounds:
-                        mismatched_times.add(t)
-            
-            for t in diff2["hitsound_data"]:
-                if t is None:
-                    continue
-                matched_time = _find_closest_match(diff1["all_times"], t)
-                if matched_time is not None:
-                    diff2_sounds = diff2["hitsound_data"].get(t)
-                    diff1_sounds = _get_hitsound_at_time(diff1["hitsound_data"], t)
-                    if diff1_sounds != diff2_sounds:
-                        mismatched_times.add(t)
+    inconsistencies = []
+    for i, group1 in enumerate(groups):
+        for group2 in groups[i + 1:]:
+            mismatched_times = _mismatched_times(group1, group2)
             
             if mismatched_times:
+                # Report the smaller group as the one that differs
+                differing, reference = sorted((group1, group2), key=lambda g: len(g["names"]))
                 inconsistencies.append({
-                    "diff1": diff1_name,
-                    "diff2": diff2_name,
+                    "differing": differing["names"],
+                    "reference": reference["names"],
                     "times": sorted(mismatched_times)
                 })
     
     if not inconsistencies:
         return CheckResult(CheckStatus.PASS, "HS Inconsistency")
     
+    agreeing = [g["names"] for g in groups if len(g["names"]) > 1]
+    
     # Build the attachment content with all differences
     attachment_lines = []
+    for names in agreeing:
+        attachment_lines.append(f"Difficulties {_format_names(names)} have matching hitsounds.")
+    if agreeing:
+        attachment_lines.append("")
+    
     for inc in inconsistencies:
         times = inc["times"]
         formatted = [format_timestamp(t) for t in times]
-        attachment_lines.append(f"Hitsound differences between '{inc['diff1']}' and '{inc['diff2']}' ({len(times)} total):")
+        attachment_lines.append(f"{_format_names(inc['differing'])} {_differs(inc['differing'])} from {_format_names(inc['reference'])} ({len(times)} total):")
         for i in range(0, len(formatted), 10):
             attachment_lines.append(", ".join(formatted[i:i + 10]))
         attachment_lines.append("")
@@ -142,10 +138,12 @@ def check_hitsound_consistency(result):
     
     # Build summary message
     messages = ["Ensure these are intentional. If they're not, consider using __/copyhitsounds__ to make them consistent."]
+    for names in agreeing[:5]:
+        messages.append(f"- {_format_names(names)} agree")
     for inc in inconsistencies[:5]:  # Limit to 5 messages
         times = inc["times"]
         messages.append(
-            f"- '{inc['diff1']}' and '{inc['diff2']}' have mismatched hitsounds ({len(times)} differences)"
+            f"- {_format_names(inc['differing'])} {_differs(inc['differing'])} from {_format_names(inc['reference'])} ({len(times)} differences)"
         )
     
     if len(inconsistencies) > 5:
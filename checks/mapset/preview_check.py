@@ -1,6 +1,6 @@
 from checks.base import CheckResult, CheckStatus
 
-def check_preview(result):
+def check_preview(result, difficulties):
     meta = result.get("meta", {})
     preview_time = meta.get("previewTime", -1)
     
@@ -1,13 +1,11 @@
 from checks.base import CheckResult, CheckStatus
-from apis.rhythmtyper import calculate_drain_time, format_length
-
-def check_spread_requirements(result):
-    difficulties = result.get("difficulties", [])
+from apis.rhythmtyper import format_length
 
+def check_spread_requirements(result, difficulties):
     if not difficulties:
         return CheckResult(CheckStatus.PASS, "Spread")
     
-    drain_times = [calculate_drain_time(diff) for diff in difficulties]
+    drain_times = [diff.drain_time for diff in difficulties]
     shortest_drain = min(drain_times) if drain_times else 0
     shortest_seconds = shortest_drain / 1000
     
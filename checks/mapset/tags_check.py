@@ -1,6 +1,6 @@
 from checks.base import CheckResult, CheckStatus
 
-def check_tags(result):
+def check_tags(result, difficulties):
     meta = result.get("meta", {})
     tags = meta.get("tags", "")
     
@@ -0,0 +1,197 @@
+import hashlib
+import importlib
+import inspect
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from functools import cached_property, lru_cache
+from typing import Callable
+
+import config
+from checks.base import CheckResult, CheckStatus
+from checks.result_cache import content_hash
+from utils.metrics import CACHE_REQUESTS, CHECK_SECONDS
+
+logger = logging.getLogger(__name__)
+
+MAPSET = "mapset"
+DIFFICULTY = "difficulty"
+
+CHEAP = "cheap"
+EXPENSIVE = "expensive"
+
+# Modules shared by the checks whose code decides their verdicts and messages
+DEPENDENCY_MODULES = (
+    "checks.base",
+    "utils.parsed_difficulty",
+    "utils.time_index",
+    "apis.rhythmtyper"
+)
+
+
+def _source_hash(module_name):
+    try:
+        source = inspect.getsource(importlib.import_module(module_name))
+    except (OSError, TypeError, ImportError):
+        # Without its source (a frozen build), the module can't be told apart
+        source = module_name
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def _dependency_hash():
+    combined = "".join(_source_hash(name) for name in DEPENDENCY_MODULES)
+    return hashlib.sha256(combined.encode("ascii")).hexdigest()[:16]
+
+
+@dataclass(frozen=True)
+class Check:
+    """
+    A registered check. Mapset checks are called as func(result, difficulties),
+    difficulty checks as func(difficulty) once per difficulty.
+
+    `inputs` names the memoized ParsedDifficulty values the check reads, which
+    are computed up front so concurrently running checks never race to build
+    them. EXPENSIVE checks run on the check thread pool, CHEAP ones inline.
+
+    Cached results are keyed by `cache_tag`, which changes whenever the
+    source of the check's module or of any of DEPENDENCY_MODULES does. Bump
+    `version` when a check's output changes because of anything else.
+    """
+    func: Callable
+    name: str
+    scope: str
+    cost: str = CHEAP
+    inputs: tuple = ()
+    version: int = 1
+
+    @cached_property
+    def cache_tag(self):
+        try:
+            source = inspect.getsource(sys.modules[self.func.__module__])
+        except (OSError, TypeError, KeyError):
+            source = self.func.__code__.co_code.hex()
+        source_hash = hashlib.sha256(source.encode("utf-8")).hexdigest()[:16]
+        return (
+            f"{self.func.__module__}.{self.func.__qualname__}:{self.version}:"
+            f"{source_hash}:{_dependency_hash()}"
+        )
+
+
+def run_check(check, *args):
+    """Run one check, timing it and turning an exception into an ERROR result."""
+    start = time.perf_counter()
+    try:
+        result = check.func(*args)
+    except Exception as e:
+        logger.exception(f"Check {check.name} failed")
+        result = CheckResult(CheckStatus.ERROR, check.name, f"The check crashed ({type(e).__name__}: {e}).")
+    result.elapsed_ms = (time.perf_counter() - start) * 1000
+    return result
+
+
+def _prepare_inputs(difficulty, inputs):
+    for name in inputs:
+        try:
+            getattr(difficulty, name)
+        except Exception:
+            # Left for the checks that read it to fail on and report
+            pass
+
+
+def _mapset_hash(result, difficulty_hashes, difficulties):
+    # Mapset checks see everything but the raw difficulties, plus every difficulty in order
+    return content_hash({
+        "result": {key: value for key, value in result.items() if key != "difficulties"},
+        "difficulties": [(diff.filename, h) for diff, h in zip(difficulties, difficulty_hashes)]
+    })
+
+
+def _execute(calls, difficulties, inputs, threads):
+    if threads > 1 and sum(check.cost == EXPENSIVE for check, _ in calls) > 1:
+        with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="check") as pool:
+            list(pool.map(lambda d: _prepare_inputs(d, inputs), difficulties))
+            pending = {
+                i: pool.submit(run_check, check, *args)
+                for i, (check, args) in enumerate(calls) if check.cost == EXPENSIVE
+            }
+            # Cheap checks run here while the expensive ones are in flight
+            outcomes = [
+                None if i in pending else run_check(check, *args)
+                for i, (check, args) in enumerate(calls)
+            ]
+            for i, future in pending.items():
+                outcomes[i] = future.result()
+            return outcomes
+
+    for difficulty in difficulties:
+        _prepare_inputs(difficulty, inputs)
+    return [run_check(check, *args) for check, args in calls]
+
+
+def run_checks(result, difficulties, mapset_checks, difficulty_checks, threads=None, cache=None):
+    """
+    Run every mapset check once and every difficulty check per difficulty.
+    Returns (mapset_results, [difficulty_results, ...]) in registration order.
+
+    With a CheckResultCache, difficulty checks only run on difficulties whose
+    JSON changed and mapset checks only when anything in the mapset did.
+    Cached results have no elapsed_ms.
+    """
+    threads = config.CHECK_THREADS if threads is None else threads
+    inputs = {
+        name
+        for check in (*mapset_checks, *difficulty_checks)
+        for name in check.inputs
+    }
+
+    calls = [(check, (result, difficulties)) for check in mapset_checks]
+    for difficulty in difficulties:
+        calls.extend((check, (difficulty,)) for check in difficulty_checks)
+
+    outcomes = [None] * len(calls)
+    keys = None
+    if cache is not None:
+        difficulty_hashes = [content_hash(diff.data) for diff in difficulties]
+        mapset_hash = _mapset_hash(result, difficulty_hashes, difficulties)
+        keys = [(check.cache_tag, mapset_hash) for check in mapset_checks]
+        for h in difficulty_hashes:
+            keys.extend((check.cache_tag, h) for check in difficulty_checks)
+
+        cached = cache.get_many(set(keys))
+        hits = sum(key in cached for key in keys)
+        CACHE_REQUESTS.inc(hits, cache="check", result="hit")
+        CACHE_REQUESTS.inc(len(keys) - hits, cache="check", result="miss")
+        for i, key in enumerate(keys):
+            if key in cached:
+                outcomes[i] = replace(cached[key])
+
+    todo = [i for i, outcome in enumerate(outcomes) if outcome is None]
+    if todo:
+        todo_calls = [calls[i] for i in todo]
+        # Only difficulties with checks left to run need their inputs, unless
+        # a mapset check (which reads all of them) has to run too
+        if any(check.scope == MAPSET for check, _ in todo_calls):
+            stale = difficulties
+        else:
+            changed = {id(args[0]) for _, args in todo_calls}
+            stale = [diff for diff in difficulties if id(diff) in changed]
+        for i, outcome in zip(todo, _execute(todo_calls, stale, inputs, threads)):
+            outcomes[i] = outcome
+            CHECK_SECONDS.observe(outcome.elapsed_ms / 1000, check=calls[i][0].name)
+
+        if cache is not None:
+            cache.put_many({
+                keys[i]: outcomes[i] for i in todo
+                if outcomes[i].status != CheckStatus.ERROR
+            })
+
+    mapset_results = outcomes[:len(mapset_checks)]
+    per_difficulty = len(difficulty_checks)
+    difficulty_results = [
+        outcomes[len(mapset_checks) + i * per_difficulty:len(mapset_checks) + (i + 1) * per_difficulty]
+        for i in range(len(difficulties))
+    ]
+    return mapset_results, difficulty_results
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+from checks.base import CheckResult, CheckStatus
+
+logger = logging.getLogger(__name__)
+
+# Entries beyond the limit are pruned in batches of at least this many
+PRUNE_BATCH = 256
+
+
+def content_hash(value):
+    """Stable hash of a JSON-compatible value."""
+    encoded = json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _dump_result(result):
+    return json.dumps({
+        "status": result.status.value,
+        "name": result.name,
+        "message": result.message,
+        "attachment": result.attachment
+    })
+
+
+def _load_result(data):
+    fields = json.loads(data)
+    attachment = fields.get("attachment")
+    return CheckResult(
+        CheckStatus(fields["status"]),
+        fields["name"],
+        fields.get("message", ""),
+        tuple(attachment) if attachment else None
+    )
+
+
+class CheckResultCache:
+    """
+    Persistent, bounded cache of check results in SQLite, keyed by a check's
+    cache tag and the hash of the content it looked at.
+
+    Safe to share between threads and between worker processes; the least
+    recently used entries are dropped once there are more than `max_entries`.
+    """
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " check_tag TEXT NOT NULL,"
+            " content_hash TEXT NOT NULL,"
+            " result TEXT NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (check_tag, content_hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+
+    @contextmanager
+    def _transaction(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def get_many(self, keys):
+        """
+        Look up (check_tag, content_hash) keys. Returns {key: CheckResult} for
+        the hits; database errors are logged and treated as misses.
+        """
+        if not keys:
+            return {}
+
+        found = {}
+        now = time.time()
+        try:
+            with self._lock:
+                for key in keys:
+                    row = self._conn.execute(
+                        "SELECT result FROM results WHERE check_tag = ? AND content_hash = ?", key
+                    ).fetchone()
+                    if row:
+                        found[key] = _load_result(row[0])
+                if found:
+                    with self._transaction():
+                        self._conn.executemany(
+                            "UPDATE results SET last_used = ? WHERE check_tag = ? AND content_hash = ?",
+                            [(now, *key) for key in found]
+                        )
+        except sqlite3.Error:
+            logger.warning("Check result cache lookup failed", exc_info=True)
+        return found
+
+    def put_many(self, items):
+        """Store {(check_tag, content_hash): CheckResult}. Failures are logged, not raised."""
+        if not items:
+            return
+
+        now = time.time()
+        try:
+            with self._lock:
+                with self._transaction():
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO results (check_tag, content_hash, result, last_used) VALUES (?, ?, ?, ?)",
+                        [(*key, _dump_result(result), now) for key, result in items.items()]
+                    )
+                self._prune()
+        except sqlite3.Error:
+            logger.warning("Could not store check results", exc_info=True)
+
+    def _prune(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        excess = count - self.max_entries
+        if excess <= 0:
+            return
+        excess = max(excess, min(PRUNE_BATCH, self.max_entries // 10))
+        self._conn.execute(
+            "DELETE FROM results WHERE rowid IN (SELECT rowid FROM results ORDER BY last_used LIMIT ?)",
+            (excess,)
+        )
+        logger.info(f"Pruned {excess} cached check result(s)")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_cache = None
+_default_cache_pid = None
+
+
+def default_cache():
+    """The process-wide cache configured in config.py, or None when it's disabled or can't be opened."""
+    global _default_cache, _default_cache_pid
+    if config.CHECK_CACHE_MAX_ENTRIES <= 0:
+        return None
+    # Connections don't survive fork, so each worker process opens its own
+    if _default_cache_pid != os.getpid():
+        _default_cache_pid = os.getpid()
+        try:
+            _default_cache = CheckResultCache(config.CHECK_CACHE_PATH, config.CHECK_CACHE_MAX_ENTRIES)
+        except (sqlite3.Error, OSError):
+            # Not retried in this process, so the failure is logged once
+            logger.exception("Could not open the check result cache, running without it")
+            _default_cache = None
+    return _default_cache
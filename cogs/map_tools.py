@@ -1,12 +1,16 @@
 import logging
+import time
 from datetime import datetime
 from io import BytesIO
 import discord
 from discord import app_commands
 from discord.ext import commands
 from apis.rhythmtyper import *
-from utils.embed_helper import embed_generate
-from tools.hitsound_copier import copy_hitsounds
+from utils.embed_helper import embed_generate, queue_position_updater
+from pipeline import QueueFull, archive_payload, copy_archive_hitsounds
+from utils.ingest import ingest_attachment
+from utils import profiling, tracing
+from utils.metrics import COMMANDS, STAGE_SECONDS
 
 logger = logging.getLogger(__name__)
 
@@ -32,17 +36,21 @@ class MapTools(commands.Cog):
         await interaction.response.defer()
 
         try:
-            metadata = await fetch_online_beatmap_metadata(map_id)
+            with STAGE_SECONDS.time(command="map", stage="fetch"):
+                metadata = await self.bot.rhythmtyper.fetch_online_beatmap_metadata(map_id)
         except ValueError as e:
+            COMMANDS.inc(command="map", outcome="not_found")
             embed = embed_generate(type="error", title="Not Found", description=str(e))
             await interaction.followup.send(embed=embed)
             return
         except RuntimeError as e:
+            COMMANDS.inc(command="map", outcome="error")
             embed = embed_generate(type="error", title="Error", description=str(e))
             await interaction.followup.send(embed=embed)
             return
 
         if not metadata.get("beatmaps"):
+            COMMANDS.inc(command="map", outcome="not_found")
             embed = embed_generate(type="error", title="Not Found", description="No beatmap found with that ID.")
             await interaction.followup.send(embed=embed)
             return
@@ -89,7 +97,9 @@ class MapTools(commands.Cog):
             )
             embed.add_field(name=f"{diff['name']} | {sr:.2f} ★", value=stats, inline=True)
 
-        await interaction.followup.send(embed=embed)
+        with STAGE_SECONDS.time(command="map", stage="send"):
+            await interaction.followup.send(embed=embed)
+        COMMANDS.inc(command="map", outcome="ok")
 
     @app_commands.command(name="copyhitsounds", description="Copy hitsounds from one difficulty to all others")
     @app_commands.describe(
@@ -116,10 +126,34 @@ class MapTools(commands.Cog):
             return
 
         await interaction.response.defer(ephemeral=True)
+        with tracing.span(
+            "copyhitsounds",
+            user=interaction.user.id,
+            guild=interaction.guild_id,
+            attachment=file.filename,
+            attachment_bytes=file.size,
+            source_difficulty=source_difficulty
+        ), profiling.profile_if_slow("copyhitsounds"):
+            await self.run_hitsounds_copy(interaction, file, source_difficulty, ignore_tapvolumes, ignore_holdvolumes)
+
+    async def run_hitsounds_copy(self, interaction, file, source_difficulty, ignore_tapvolumes, ignore_holdvolumes):
+        started = time.perf_counter()
+        outcome = "error"
 
         try:
-            zip_bytes = BytesIO(await file.read())
-            output, stats = copy_hitsounds(zip_bytes, source_difficulty, ignore_tapvolumes, ignore_holdvolumes)
+            on_position = queue_position_updater(interaction)
+            async with self.bot.scheduler.slot(interaction.user.id, interaction.guild_id, on_position):
+                with tracing.stage("copyhitsounds", "ingest"):
+                    zip_file = await ingest_attachment(self.bot.rhythmtyper.session, file)
+                with zip_file, archive_payload(zip_file) as payload:
+                    output_bytes, stats = await self.bot.executor.run(
+                        copy_archive_hitsounds,
+                        payload,
+                        source_difficulty,
+                        ignore_tapvolumes,
+                        ignore_holdvolumes
+                    )
+            output = BytesIO(output_bytes)
             
             output_filename = file.filename.replace('.rtm', '_hitsounded.rtm')
             
@@ -133,12 +167,19 @@ class MapTools(commands.Cog):
                     f"❗This feature is __experimental__. Be sure to double check the hitsounds. ❗"
                 )
             )
-            await interaction.followup.send(
-                embed=embed,
-                file=discord.File(output, filename=output_filename),
-                ephemeral=True
-            )
+            with tracing.stage("copyhitsounds", "send"):
+                await interaction.followup.send(
+                    embed=embed,
+                    file=discord.File(output, filename=output_filename),
+                    ephemeral=True
+                )
+            outcome = "ok"
             
+        except QueueFull as e:
+            outcome = "busy"
+            embed = embed_generate(type="error", title="Bot Busy", description=str(e))
+            await interaction.followup.send(embed=embed, ephemeral=True)
+
         except Exception as e:
             embed = embed_generate(
                 type="error",
@@ -147,6 +188,11 @@ class MapTools(commands.Cog):
             )
             await interaction.followup.send(embed=embed, ephemeral=True)
 
+        finally:
+            tracing.set_attributes(outcome=outcome)
+            COMMANDS.inc(command="copyhitsounds", outcome=outcome)
+            STAGE_SECONDS.observe(time.perf_counter() - started, command="copyhitsounds", stage="total")
+
 
 async def setup(bot):
     await bot.add_cog(MapTools(bot))
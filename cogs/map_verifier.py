@@ -1,14 +1,21 @@
 import asyncio
 import logging
+import time
 import discord
 from discord import app_commands
 from discord.ext import commands
 from io import BytesIO
 import json
 
+import config
 from utils.embed_helper import *
 from apis.rhythmtyper import *
-from checks import run_meta_checks, run_difficulty_checks, CheckStatus
+from checks import CheckStatus
+from pipeline import InvalidArchive, QueueFull, archive_payload, verify_archive
+from utils.ingest import ArchiveTooLarge, ingest_attachment
+from utils import profiling, tracing
+from utils.metrics import COMMANDS, STAGE_SECONDS
+from utils.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
@@ -17,16 +24,69 @@ class MapVerifier(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
+        self.inflight = SingleFlight()
+
+    async def fetch_and_check(self, map_id):
+        if config.PARTIAL_FETCH:
+            # Analysis runs between the range requests, so it's part of this stage
+            with tracing.stage("verifymap", "partial_fetch"):
+                zip_file, verification = await self.bot.rhythmtyper.fetch_beatmap_partial(map_id, self.run_verify)
+            zip_file.close()
+            return verification
+        
+        with tracing.stage("verifymap", "fetch"):
+            zip_file = await self.bot.rhythmtyper.fetch_beatmap(map_id)
+        with zip_file:
+            return await self.run_verify(zip_file)
+
+    async def run_verify(self, zip_file):
+        with archive_payload(zip_file) as payload:
+            return await self.bot.executor.run(verify_archive, payload)
+
+    async def verify_attachment(self, file):
+        with tracing.stage("verifymap", "ingest"):
+            zip_file = await ingest_attachment(self.bot.rhythmtyper.session, file)
+        with zip_file:
+            return await self.run_verify(zip_file)
+
+    async def send(self, interaction, **kwargs):
+        with tracing.stage("verifymap", "send"):
+            await interaction.followup.send(**kwargs)
+
+    async def run_scheduled(self, interaction, func, *args):
+        """Run func once the scheduler admits this user's request."""
+        on_position = queue_position_updater(interaction)
+        async with self.bot.scheduler.slot(interaction.user.id, interaction.guild_id, on_position):
+            return await func(*args)
+
+    async def verify_map_id(self, interaction, map_id):
+        """
+        Verify a map by ID. Concurrent verifications of the same map share one
+        download and analysis, and only the request that starts it holds a
+        scheduler slot; the others wait on it without taking one.
+        """
+        # Nothing between each membership check and joining the flight yields,
+        # so the flight can't finish in between
+        if map_id in self.inflight:
+            return await self.inflight.run(map_id, self.fetch_and_check, map_id)
+        async with self.bot.scheduler.slot(
+            interaction.user.id, interaction.guild_id, queue_position_updater(interaction)
+        ):
+            if map_id not in self.inflight:
+                return await self.inflight.run(map_id, self.fetch_and_check, map_id)
+        # Another request started this map while this one was queued
+        return await self.inflight.run(map_id, self.fetch_and_check, map_id)
 
     def build_results_embed(self, title, check_results, color_override=None, description=None):
         fails = [r for r in check_results if r.status == CheckStatus.FAIL]
         warnings = [r for r in check_results if r.status == CheckStatus.WARNING]
         infos = [r for r in check_results if r.status == CheckStatus.INFO]
+        errors = [r for r in check_results if r.status == CheckStatus.ERROR]
 
-        if not (fails or warnings or infos):
+        if not (fails or warnings or infos or errors):
             return None
 
-        color = color_override or (0xED4245 if fails else 0xFEE75C if warnings else 0x57F287)
+        color = color_override or (0xED4245 if fails or errors else 0xFEE75C if warnings else 0x57F287)
         embed = discord.Embed(title=title, description=description, color=color)
 
         if infos:
@@ -41,6 +101,10 @@ class MapVerifier(commands.Cog):
             warn_text = "\n".join(f"⚠️ **{r.name}**: {r.message}" for r in warnings)
             embed.add_field(name="Warnings", value=warn_text, inline=False)
 
+        if errors:
+            error_text = "\n".join(f"❗ **{r.name}**: {r.message}" for r in errors)
+            embed.add_field(name="Checks That Could Not Run", value=error_text, inline=False)
+
         return embed
 
     @app_commands.command(name="verifymap", description="Verify a beatmap from a URL or file attachment")
@@ -65,6 +129,19 @@ class MapVerifier(commands.Cog):
             return
 
         await interaction.response.defer(ephemeral=True)
+        with tracing.span(
+            "verifymap",
+            user=interaction.user.id,
+            guild=interaction.guild_id,
+            url=url,
+            attachment=file.filename if file else None,
+            attachment_bytes=file.size if file else None
+        ), profiling.profile_if_slow("verifymap"):
+            await self.run_verification(interaction, url, file)
+
+    async def run_verification(self, interaction, url, file):
+        started = time.perf_counter()
+        outcome = "rejected"
 
         try:
             result = None
@@ -73,41 +150,76 @@ class MapVerifier(commands.Cog):
             
             if url:
                 map_id = extract_beatmap_id_from_url(url)
+                tracing.set_attributes(map_id=map_id)
                 if not map_id:
                     embed = embed_generate(type="error", title="Invalid URL", description="Could not extract beatmap ID from the provided URL.")
-                    await interaction.followup.send(embed=embed, ephemeral=True)
+                    await self.send(interaction, embed=embed, ephemeral=True)
                     return
 
                 try:
-                    zip_bytes = await fetch_beatmap(map_id)
-                    result = analyze_beatmap(zip_bytes)
+                    result, meta_results, difficulty_results = await self.verify_map_id(interaction, map_id)
+                except QueueFull as e:
+                    outcome = "busy"
+                    embed = embed_generate(type="error", title="Bot Busy", description=str(e))
+                    await self.send(interaction, embed=embed, ephemeral=True)
+                    return
+                except ArchiveTooLarge as e:
+                    embed = embed_generate(type="error", title="Map Too Large", description=str(e))
+                    await self.send(interaction, embed=embed, ephemeral=True)
+                    return
+                except InvalidArchive as e:
+                    embed = embed_generate(type="error", title="Invalid Map File", description=f"The map could not be parsed as a valid beatmap.\n\n**Error:** `{e}`")
+                    await self.send(interaction, embed=embed, ephemeral=True)
+                    return
                 except ValueError as e:
                     embed = embed_generate(type="error", title="Not Found", description=str(e))
-                    await interaction.followup.send(embed=embed, ephemeral=True)
+                    await self.send(interaction, embed=embed, ephemeral=True)
                     return
                 except RuntimeError as e:
                     embed = embed_generate(type="error", title="Error", description=str(e))
-                    await interaction.followup.send(embed=embed, ephemeral=True)
+                    await self.send(interaction, embed=embed, ephemeral=True)
                     return
 
             elif file:
                 try:
-                    zip_bytes = BytesIO(await file.read())
-                    result = analyze_beatmap(zip_bytes)
-                except Exception as e:
-                    logger.exception(f"Failed to parse beatmap file: {file.filename}")
-                    embed = embed_generate(type="error", title="Invalid Map File", description=f"The provided file could not be parsed as a valid beatmap.\n\n**Error:** `{type(e).__name__}: {e}`")
-                    await interaction.followup.send(embed=embed, ephemeral=True)
+                    result, meta_results, difficulty_results = await self.run_scheduled(interaction, self.verify_attachment, file)
+                except QueueFull as e:
+                    outcome = "busy"
+                    embed = embed_generate(type="error", title="Bot Busy", description=str(e))
+                    await self.send(interaction, embed=embed, ephemeral=True)
+                    return
+                except ArchiveTooLarge as e:
+                    embed = embed_generate(type="error", title="Map Too Large", description=str(e))
+                    await self.send(interaction, embed=embed, ephemeral=True)
+                    return
+                except InvalidArchive as e:
+                    logger.warning(f"Failed to parse beatmap file {file.filename}: {e}")
+                    embed = embed_generate(type="error", title="Invalid Map File", description=f"The provided file could not be parsed as a valid beatmap.\n\n**Error:** `{e}`")
+                    await self.send(interaction, embed=embed, ephemeral=True)
                     return
             
-            if not result or not isinstance(result, dict) or not result.get("meta"):
+            if meta_results is None:
                 embed = embed_generate(type="error", title="Invalid Map File", description="The provided file could not be parsed as a valid beatmap.")
-                await interaction.followup.send(embed=embed, ephemeral=True)
+                await self.send(interaction, embed=embed, ephemeral=True)
                 return
             
+            outcome = "ok"
+            tracing.set_attributes(
+                map_name=result.get("meta", {}).get("songName"),
+                difficulties=len(difficulty_results)
+            )
             with open("verification_result.txt", "w", encoding="utf-8") as f:
                 json.dump(result, f, indent=2)
             
+            all_results = meta_results + [r for _, _, diff_results in difficulty_results for r in diff_results]
+            timed = [r for r in all_results if r.elapsed_ms is not None]
+            if timed:
+                slowest = max(timed, key=lambda r: r.elapsed_ms)
+                logger.info(
+                    f"Ran {len(timed)} checks, {sum(r.elapsed_ms for r in timed):.1f} ms in total "
+                    f"(slowest: {slowest.name} {slowest.elapsed_ms:.1f} ms)"
+                )
+            
             map_name = result.get("meta", {}).get("songName", "Unknown")
             mapper_name = result.get("meta", {}).get("mapper", "Unknown")
             if map_id:
@@ -115,7 +227,6 @@ class MapVerifier(commands.Cog):
             else:
                 logger.info(f"{interaction.user} checked map '{map_name}' by {mapper_name} (file: {file.filename})")
             
-            meta_results = run_meta_checks(result)
             meta_embed = self.build_results_embed("Mapset Verification Results", meta_results)
             
             # Collect any attachments from check results
@@ -128,38 +239,39 @@ class MapVerifier(commands.Cog):
             if meta_embed:
                 meta_embed.set_footer(text="ℹ️ Info • ⚠️ Potential issue • ❌ Unrankable")
                 if attachments:
-                    await interaction.followup.send(embed=meta_embed, files=attachments, ephemeral=True)
+                    await self.send(interaction, embed=meta_embed, files=attachments, ephemeral=True)
                 else:
-                    await interaction.followup.send(embed=meta_embed, ephemeral=True)
+                    await self.send(interaction, embed=meta_embed, ephemeral=True)
             else:
                 embed = embed_generate(type="success", title="Mapset Checks Passed", description="No mapset-level issues found!")
-                await interaction.followup.send(embed=embed, ephemeral=True)
+                await self.send(interaction, embed=embed, ephemeral=True)
 
-            difficulties = result.get("difficulties", [])
-            
-            for diff in difficulties:
+            for diff, drain_time_ms, diff_results in difficulty_results:
                 diff_name = diff.get("data", {}).get("name", "Unknown")
                 diff_filename = diff.get("filename", "Unknown")
-                drain_time_ms = calculate_drain_time(diff)
                 drain_time_formatted = format_length(drain_time_ms / 1000)
                 diff_description = f"Drain Time: {drain_time_formatted}\nFile Name: {diff_filename}"
                 
-                diff_results = run_difficulty_checks(diff)
-                
                 diff_embed = self.build_results_embed(f"Difficulty: {diff_name}", diff_results, description=diff_description)
                 
                 if diff_embed:
                     await asyncio.sleep(1)
-                    await interaction.followup.send(embed=diff_embed, ephemeral=True)
+                    await self.send(interaction, embed=diff_embed, ephemeral=True)
                 else:
                     embed = embed_generate(type="success", title=f"Difficulty: {diff_name}", description=f"{diff_description}\n\nAll checks passed!")
                     await asyncio.sleep(1)
-                    await interaction.followup.send(embed=embed, ephemeral=True)
+                    await self.send(interaction, embed=embed, ephemeral=True)
         
         except Exception as e:
+            outcome = "error"
             logger.exception("Unexpected error during map verification")
             embed = embed_generate(type="error", title="Verification Error", description=f"An unexpected error occurred during verification.\n\n**Error:** `{type(e).__name__}: {e}`")
-            await interaction.followup.send(embed=embed, ephemeral=True)
+            await self.send(interaction, embed=embed, ephemeral=True)
+        
+        finally:
+            tracing.set_attributes(outcome=outcome)
+            COMMANDS.inc(command="verifymap", outcome=outcome)
+            STAGE_SECONDS.observe(time.perf_counter() - started, command="verifymap", stage="total")
 
 
 async def setup(bot):
@@ -0,0 +1,101 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _str(name, default):
+    value = os.getenv(name)
+    return value if value not in (None, "") else default
+
+
+DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
+
+# RhythmTyper API
+RT_API_URL = _str("RT_API_URL", "https://us-central1-rhythm-typer.cloudfunctions.net/api")
+RT_STORAGE_URL = _str("RT_STORAGE_URL", "https://storage.googleapis.com/rhythm-typer.firebasestorage.app")
+
+# Shared HTTP connection pool
+HTTP_CONNECTION_LIMIT = _int("HTTP_CONNECTION_LIMIT", 100)
+HTTP_CONNECTION_LIMIT_PER_HOST = _int("HTTP_CONNECTION_LIMIT_PER_HOST", 10)
+HTTP_DNS_CACHE_TTL = _int("HTTP_DNS_CACHE_TTL", 300)
+HTTP_KEEPALIVE_TIMEOUT = _int("HTTP_KEEPALIVE_TIMEOUT", 30)
+HTTP_REQUEST_TIMEOUT = _int("HTTP_REQUEST_TIMEOUT", 60)
+
+# On-disk cache of downloaded .rtm archives (0 disables it)
+ARCHIVE_CACHE_DIR = _str("ARCHIVE_CACHE_DIR", "cache/archives")
+ARCHIVE_CACHE_MAX_BYTES = _int("ARCHIVE_CACHE_MAX_BYTES", 1024 * 1024 * 1024)
+
+# In-process cache of /map metadata lookups
+METADATA_CACHE_SIZE = _int("METADATA_CACHE_SIZE", 1024)
+METADATA_CACHE_TTL = _int("METADATA_CACHE_TTL", 300)
+METADATA_CACHE_NEGATIVE_TTL = _int("METADATA_CACHE_NEGATIVE_TTL", 30)
+
+# Fetch only the archive members verification needs via HTTP Range requests
+PARTIAL_FETCH = _int("PARTIAL_FETCH", 0) == 1
+
+# Downloaded and uploaded archives: hard size cap, and how much is kept in
+# memory before spilling to a temporary file
+MAX_ARCHIVE_BYTES = _int("MAX_ARCHIVE_BYTES", 100 * 1024 * 1024)
+SPOOL_MEMORY_BYTES = _int("SPOOL_MEMORY_BYTES", 8 * 1024 * 1024)
+
+# Limits on what an archive's central directory says it unpacks to, checked
+# before anything is decompressed (0 disables each). Archives over the member
+# count or JSON size are refused; over MAX_UNCOMPRESSED_BYTES (which is what
+# bounds a zip bomb) verification skips media probing and hitsound copying is
+# refused
+MAX_UNCOMPRESSED_BYTES = _int("MAX_UNCOMPRESSED_BYTES", 512 * 1024 * 1024)
+MAX_JSON_BYTES = _int("MAX_JSON_BYTES", 64 * 1024 * 1024)
+MAX_ARCHIVE_MEMBERS = _int("MAX_ARCHIVE_MEMBERS", 2000)
+
+# Worker processes for archive analysis, checks and hitsound copying
+# (0 runs them on a pool of WORKER_THREADS threads instead)
+WORKER_PROCESSES = _int("WORKER_PROCESSES", min(os.cpu_count() or 1, 4))
+WORKER_THREADS = _int("WORKER_THREADS", min(os.cpu_count() or 1, 4))
+WORKER_MAX_TASKS = _int("WORKER_MAX_TASKS", 0)
+WORKER_START_METHOD = _str("WORKER_START_METHOD", "spawn")
+JOB_TIMEOUT = _int("JOB_TIMEOUT", 120)
+
+# Admission control for /verifymap and /copyhitsounds: jobs running at once
+# (overall and per user), how many may wait, and how often (seconds) a
+# waiting user's queue position is refreshed
+MAX_CONCURRENT_JOBS = _int("MAX_CONCURRENT_JOBS", max(WORKER_PROCESSES or WORKER_THREADS, 1))
+MAX_JOBS_PER_USER = _int("MAX_JOBS_PER_USER", 1)
+MAX_QUEUED_JOBS = _int("MAX_QUEUED_JOBS", 50)
+MAX_QUEUED_PER_USER = _int("MAX_QUEUED_PER_USER", 3)
+QUEUE_UPDATE_INTERVAL = _int("QUEUE_UPDATE_INTERVAL", 2)
+
+# Threads each verification uses to run expensive checks concurrently
+CHECK_THREADS = _int("CHECK_THREADS", 4)
+
+# Persistent cache of check results for unchanged difficulties (0 entries disables it)
+CHECK_CACHE_PATH = _str("CHECK_CACHE_PATH", "cache/check_results.sqlite3")
+CHECK_CACHE_MAX_ENTRIES = _int("CHECK_CACHE_MAX_ENTRIES", 100000)
+
+# Prometheus-format metrics at http://METRICS_HOST:METRICS_PORT/metrics (port 0 disables it)
+METRICS_HOST = _str("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = _int("METRICS_PORT", 9108)
+
+# Command traces are logged as JSON when they take at least this long (ms)
+TRACE_LOG_MIN_MS = _int("TRACE_LOG_MIN_MS", 0)
+
+# pstats dumps of commands slower than PROFILE_SLOW_MS (0 disables profiling),
+# sampled every PROFILE_INTERVAL_MS. While a profiled command runs, the
+# profiler's hooks slow everything on the event loop and pure-Python job stages
+# such as hitsound copying (about 2.5x), so only PROFILE_SAMPLE_PERCENT of
+# commands run under it; the newest PROFILE_KEEP dumps are kept
+PROFILE_SLOW_MS = _int("PROFILE_SLOW_MS", 10000)
+PROFILE_SAMPLE_PERCENT = _int("PROFILE_SAMPLE_PERCENT", 10)
+PROFILE_INTERVAL_MS = _int("PROFILE_INTERVAL_MS", 10)
+PROFILE_DIR = _str("PROFILE_DIR", "cache/profiles")
+PROFILE_KEEP = _int("PROFILE_KEEP", 20)
+
+# Peak memory of each job stage, measured in workers: "rss" (the kernel's
+# high-water mark for the whole worker process, Linux only), "tracemalloc"
+# (exact Python allocations, but several times slower) or "off"
+MEMORY_ACCOUNTING = _str("MEMORY_ACCOUNTING", "rss")
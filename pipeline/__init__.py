@@ -0,0 +1,3 @@
+from .executor import JobExecutor, JobTimeout
+from .scheduler import JobScheduler, QueueFull
+from .jobs import InvalidArchive, archive_payload, check_beatmap, verify_archive, copy_archive_hitsounds
@@ -0,0 +1,216 @@
+import asyncio
+import contextvars
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import config
+from utils import memory, metrics, profiling, tracing
+
+logger = logging.getLogger(__name__)
+
+JOB_SECONDS = metrics.histogram(
+    "rtbot_job_seconds", "Time from submitting a job to its result, including waiting for a worker", ("job",)
+)
+JOB_FAILURES = metrics.counter("rtbot_job_failures_total", "Jobs that timed out or lost their worker", ("job", "reason"))
+
+
+def _report_pid(started):
+    # Pool initializer: tells the executor which processes are its workers.
+    # A message this small is written to the pipe atomically, so no lock is needed
+    try:
+        started.send(os.getpid())
+    except OSError:
+        # The executor has already let go of this pool
+        pass
+
+
+def _run_captured(func, args, trace_id, profiled):
+    # Runs in the worker; its metric samples, spans, memory peaks and profile
+    # travel back with the result
+    with metrics.capture() as samples, tracing.capture(trace_id) as spans:
+        with memory.accounting(func.__name__) as peaks:
+            if profiled:
+                result, session = profiling.run_profiled(func, *args)
+            else:
+                result, session = func(*args), None
+        if peaks:
+            spans.set(memory_peaks=peaks, memory_meter=peaks.meter)
+    return result, samples, spans, session
+
+
+def _run_local(func, *args):
+    if not profiling.is_profiling():
+        return func(*args)
+    result, session = profiling.run_profiled(func, *args)
+    profiling.add_job_profile(session)
+    return result
+
+
+class JobTimeout(RuntimeError):
+    pass
+
+
+class _PoolReplaced(Exception):
+    """The job's pool was torn down to stop another job, taking this one with it."""
+
+
+class JobExecutor:
+    """
+    Runs CPU-bound pipeline stages off the event loop, on a process pool
+    (or a thread pool when `workers` is 0).
+
+    Jobs that time out or whose caller is cancelled are cancelled if they
+    haven't started yet. A worker process can't be stopped on its own without
+    breaking the pool, so a job that times out while running takes the pool
+    down with it and a fresh one replaces it; other jobs caught in that are
+    retried once. On the thread pool a running job can't be interrupted and
+    its result is discarded when it finishes.
+    """
+
+    def __init__(
+        self,
+        workers=config.WORKER_PROCESSES,
+        threads=config.WORKER_THREADS,
+        timeout=config.JOB_TIMEOUT,
+        max_tasks_per_child=config.WORKER_MAX_TASKS,
+        start_method=config.WORKER_START_METHOD
+    ):
+        self.workers = workers
+        self.threads = threads
+        self.timeout = timeout
+        self.max_tasks_per_child = max_tasks_per_child or None
+        self.start_method = start_method
+        self._pool = None
+        self._started = None
+        self._worker_pids = set()
+
+    def _create_pool(self):
+        if self.workers <= 0:
+            return ThreadPoolExecutor(max_workers=max(self.threads, 1), thread_name_prefix="job")
+        context = multiprocessing.get_context(self.start_method)
+        self._started, reporter = context.Pipe(duplex=False)
+        self._worker_pids = set()
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_report_pid,
+            initargs=(reporter,),
+            max_tasks_per_child=self.max_tasks_per_child
+        )
+
+    def _workers(self):
+        """
+        Return the live worker processes of the current pool. Workers report
+        their PID once started; the pipe is drained here so it never fills up
+        as WORKER_MAX_TASKS replaces them.
+        """
+        if self._started is None:
+            return []
+        while self._started.poll():
+            self._worker_pids.add(self._started.recv())
+        # Only live children can match, so an exited worker's recycled PID is never mistaken for one
+        workers = [process for process in multiprocessing.active_children() if process.pid in self._worker_pids]
+        self._worker_pids = {process.pid for process in workers}
+        return workers
+
+    def start(self):
+        if self._pool is None:
+            self._pool = self._create_pool()
+            logger.info(f"Started job executor with {self.workers or 'no'} worker process(es)")
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _replace_pool(self, pool, terminate=False):
+        """Swap in a fresh pool for `pool`, unless another job already did."""
+        if self._pool is not pool:
+            return
+        if terminate:
+            # There's no API for stopping a running task (and killing one
+            # worker breaks its pool anyway), so every worker goes. This runs
+            # before the new pool exists, so none of its workers can share a PID
+            for process in self._workers():
+                process.terminate()
+        self._pool = self._create_pool()
+        # Not cancel_futures: jobs still queued on it should fail with
+        # BrokenProcessPool, which retries them, rather than look cancelled
+        pool.shutdown(wait=False)
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
+    async def run(self, func, *args, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        captured = self.workers > 0
+        with tracing.span("job", job=func.__name__):
+            for attempt in range(2):
+                pool = self._pool
+                if pool is None:
+                    raise RuntimeError("Job executor is not started.")
+                if captured:
+                    # Keeps the pipe of reported PIDs drained
+                    self._workers()
+                    future = pool.submit(
+                        _run_captured, func, args, tracing.current_trace_id(), profiling.is_profiling()
+                    )
+                else:
+                    # Threads don't inherit context, so spans need it carried over
+                    future = pool.submit(contextvars.copy_context().run, _run_local, func, *args)
+                try:
+                    return await self._wait(pool, future, func, timeout, captured)
+                except _PoolReplaced:
+                    if attempt:
+                        raise RuntimeError("A worker process crashed while processing this map.") from None
+                    logger.info(f"Job {func.__name__} lost its worker to a pool restart, retrying it")
+                    tracing.set_attributes(retried=True)
+
+    async def _wait(self, pool, future, func, timeout, captured):
+        try:
+            with JOB_SECONDS.time(job=func.__name__):
+                outcome = await asyncio.wait_for(asyncio.wrap_future(future), timeout or None)
+        except asyncio.TimeoutError:
+            JOB_FAILURES.inc(job=func.__name__, reason="timeout")
+            # wait_for has already tried to cancel it, which only works before it starts
+            if future.cancelled():
+                logger.warning(f"Job {func.__name__} waited {timeout}s for a worker and was cancelled")
+                raise JobTimeout(f"No worker was free to process this map within {timeout} seconds.") from None
+            if not captured:
+                logger.warning(f"Job {func.__name__} timed out after {timeout}s and is left running on its thread")
+                raise JobTimeout(f"Processing took longer than {timeout} seconds and was abandoned.") from None
+            logger.warning(f"Job {func.__name__} timed out after {timeout}s, restarting the worker pool to stop it")
+            self._replace_pool(pool, terminate=True)
+            raise JobTimeout(
+                f"Processing took longer than {timeout} seconds, so its worker process was stopped."
+            ) from None
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BrokenProcessPool:
+            if self._pool is not pool:
+                # Stopped along with another job that timed out or crashed
+                raise _PoolReplaced() from None
+            # A worker died (e.g. killed for running out of memory); start a fresh pool
+            JOB_FAILURES.inc(job=func.__name__, reason="worker_crash")
+            logger.exception(f"Worker pool broke while running {func.__name__}, restarting it")
+            self._replace_pool(pool)
+            raise RuntimeError("A worker process crashed while processing this map.") from None
+
+        if not captured:
+            return outcome
+        result, samples, spans, session = outcome
+        metrics.REGISTRY.replay(samples)
+        tracing.attach(spans)
+        profiling.add_job_profile(session)
+        peaks = spans.attributes.get("memory_peaks")
+        if peaks:
+            logger.info(f"{func.__name__} peak memory: {memory.format_peaks(peaks)}")
+        return result
@@ -0,0 +1,119 @@
+"""
+CPU-bound stages run by JobExecutor. Everything here is a module-level function
+taking and returning picklable values so it can run in a worker process.
+"""
+import logging
+from contextlib import contextmanager
+from io import BytesIO
+
+from apis.partial_fetch import MissingRange, SparseArchive
+from apis.rhythmtyper import analyze_beatmap
+from checks import parse_difficulties, run_all_checks
+from tools.hitsound_copier import copy_hitsounds
+from utils import memory, tracing
+from utils.ingest import ArchiveTooLarge
+from .shared_archive import SharedArchive
+
+logger = logging.getLogger(__name__)
+
+# Below this size pickling the bytes is cheaper than setting up shared memory
+SHARED_MEMORY_MIN_BYTES = 1024 * 1024
+
+
+class InvalidArchive(Exception):
+    """The archive could not be analyzed; the message names the original error."""
+
+
+@contextmanager
+def archive_payload(zip_file):
+    """
+    Turn an ingested archive into something that can be sent to a worker.
+    Large archives are copied once into shared memory and workers get only a
+    handle to it; the block is freed when the context exits.
+    """
+    if isinstance(zip_file, SparseArchive):
+        yield zip_file
+        return
+
+    size = zip_file.seek(0, 2)
+    zip_file.seek(0)
+    shared = None
+    if size >= SHARED_MEMORY_MIN_BYTES:
+        try:
+            shared = SharedArchive.from_file(zip_file)
+        except OSError as e:
+            # e.g. /dev/shm too small for the archive
+            logger.warning(f"Could not place archive in shared memory ({e}), sending it by value")
+            zip_file.seek(0)
+
+    if shared is None:
+        yield zip_file.read()
+        return
+
+    try:
+        yield shared
+    finally:
+        shared.release()
+
+
+@contextmanager
+def _open_archive(source):
+    if isinstance(source, SharedArchive):
+        with source.open() as reader:
+            yield reader
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        yield BytesIO(source)
+    else:
+        yield source
+
+
+def _archive_size(source):
+    if isinstance(source, (SharedArchive, SparseArchive)):
+        return source.size
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return len(source)
+    return None
+
+
+def check_beatmap(result):
+    if not result or not isinstance(result, dict) or not result.get("meta"):
+        return None, None
+
+    # Parsed once here and shared by the mapset and difficulty checks
+    with tracing.stage("verifymap", "checks") as span:
+        with memory.track("checks.parse"):
+            difficulties = parse_difficulties(result)
+        span.set(difficulties=len(difficulties), notes=[len(diff) for diff in difficulties])
+        meta_results, per_difficulty = run_all_checks(result, difficulties)
+        timed = [r for r in (*meta_results, *(r for results in per_difficulty for r in results)) if r.elapsed_ms is not None]
+        if timed:
+            slowest = max(timed, key=lambda r: r.elapsed_ms)
+            span.set(checks_run=len(timed), slowest_check=slowest.name, slowest_check_ms=round(slowest.elapsed_ms, 3))
+    difficulty_results = [
+        (diff.difficulty, diff.drain_time, results)
+        for diff, results in zip(difficulties, per_difficulty)
+    ]
+    return meta_results, difficulty_results
+
+
+def verify_archive(source):
+    """Analyze an archive and run every check. Returns (result, meta_results, difficulty_results)."""
+    try:
+        with _open_archive(source) as zip_file, tracing.stage("verifymap", "analyze", archive_bytes=_archive_size(source)):
+            result = analyze_beatmap(zip_file)
+    except (MissingRange, ArchiveTooLarge):
+        # Partial fetches need MissingRange back as-is to request more bytes,
+        # and archives over the memory budget are reported as such
+        raise
+    except Exception as e:
+        raise InvalidArchive(f"{type(e).__name__}: {e}") from None
+
+    return (result, *check_beatmap(result))
+
+
+def copy_archive_hitsounds(source, source_difficulty_name, ignore_tapvolumes=False, ignore_holdvolumes=False):
+    """Run copy_hitsounds and return (output archive bytes, stats)."""
+    with _open_archive(source) as zip_file, tracing.stage("copyhitsounds", "copy", archive_bytes=_archive_size(source)) as span:
+        output, stats = copy_hitsounds(zip_file, source_difficulty_name, ignore_tapvolumes, ignore_holdvolumes)
+        span.set(modified_notes=stats["modified_notes"], target_difficulties=stats["target_difficulties"])
+    return output.getvalue(), stats
@@ -0,0 +1,211 @@
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+import config
+from utils import metrics, tracing
+
+logger = logging.getLogger(__name__)
+
+QUEUE_WAIT_SECONDS = metrics.histogram("rtbot_queue_wait_seconds", "Time requests spent queued before getting a job slot")
+QUEUE_REJECTED = metrics.counter("rtbot_queue_rejected_total", "Requests turned away by the queue limits", ("reason",))
+
+
+class QueueFull(RuntimeError):
+    pass
+
+
+class _Waiter:
+
+    def __init__(self, guild_id, user_id):
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.granted = asyncio.get_running_loop().create_future()
+        self.position = None
+        self.reported = None
+        self.moved = asyncio.Event()
+
+
+class JobScheduler:
+    """
+    Admission control for expensive commands.
+
+    At most `max_running` jobs hold a slot at once and each user at most
+    `per_user` of them. Everyone else waits in a bounded queue that is served
+    round-robin across guilds, and across users within a guild, so one busy
+    server or one user with many uploads can't starve the rest.
+    """
+
+    def __init__(
+        self,
+        max_running=config.MAX_CONCURRENT_JOBS,
+        per_user=config.MAX_JOBS_PER_USER,
+        max_queued=config.MAX_QUEUED_JOBS,
+        max_queued_per_user=config.MAX_QUEUED_PER_USER,
+        update_interval=config.QUEUE_UPDATE_INTERVAL
+    ):
+        self.max_running = max_running
+        self.per_user = per_user
+        self.max_queued = max_queued
+        self.max_queued_per_user = max_queued_per_user
+        self.update_interval = update_interval
+
+        self.running = 0
+        self._running_by_user = {}
+        # guild -> user -> waiters, each level in round-robin order
+        self._queues = OrderedDict()
+        self._queued = 0
+        self._queued_by_user = {}
+
+        metrics.gauge("rtbot_jobs_running", "Jobs currently holding a slot", func=lambda: self.running)
+        metrics.gauge("rtbot_jobs_queued", "Requests waiting for a slot", func=lambda: self._queued)
+
+    @property
+    def queued(self):
+        return self._queued
+
+    def _user_can_run(self, user_id):
+        return self._running_by_user.get(user_id, 0) < self.per_user
+
+    def _enqueue(self, waiter):
+        users = self._queues.setdefault(waiter.guild_id, OrderedDict())
+        users.setdefault(waiter.user_id, deque()).append(waiter)
+        self._queued += 1
+        self._queued_by_user[waiter.user_id] = self._queued_by_user.get(waiter.user_id, 0) + 1
+
+    def _remove(self, waiter):
+        users = self._queues[waiter.guild_id]
+        waiters = users[waiter.user_id]
+        waiters.remove(waiter)
+        if not waiters:
+            del users[waiter.user_id]
+        if not users:
+            del self._queues[waiter.guild_id]
+        self._queued -= 1
+        self._queued_by_user[waiter.user_id] -= 1
+        if not self._queued_by_user[waiter.user_id]:
+            del self._queued_by_user[waiter.user_id]
+
+    def _take(self, waiter):
+        self.running += 1
+        self._running_by_user[waiter.user_id] = self._running_by_user.get(waiter.user_id, 0) + 1
+
+    def _next_waiter(self):
+        for guild_id, users in self._queues.items():
+            for user_id, waiters in users.items():
+                if self._user_can_run(user_id):
+                    # Served guild and user go to the back of their rotations
+                    self._queues.move_to_end(guild_id)
+                    users.move_to_end(user_id)
+                    return waiters[0]
+        return None
+
+    def _dispatch(self):
+        while self.running < self.max_running:
+            waiter = self._next_waiter()
+            if waiter is None:
+                break
+            self._remove(waiter)
+            self._take(waiter)
+            waiter.granted.set_result(None)
+        self._update_positions()
+
+    def _service_order(self):
+        """Queued waiters in the order the round-robin would serve them, ignoring per-user limits."""
+        guilds = deque(
+            deque(deque(waiters) for waiters in users.values())
+            for users in self._queues.values()
+        )
+        order = []
+        while guilds:
+            users = guilds.popleft()
+            waiters = users.popleft()
+            order.append(waiters.popleft())
+            if waiters:
+                users.append(waiters)
+            if users:
+                guilds.append(users)
+        return order
+
+    def _update_positions(self):
+        for position, waiter in enumerate(self._service_order(), start=1):
+            if waiter.position != position:
+                waiter.position = position
+                waiter.moved.set()
+
+    def _release(self, user_id):
+        self.running -= 1
+        self._running_by_user[user_id] -= 1
+        if not self._running_by_user[user_id]:
+            del self._running_by_user[user_id]
+        self._dispatch()
+
+    async def _notify(self, on_position, position):
+        try:
+            await on_position(position)
+        except Exception:
+            logger.warning("Failed to report queue position", exc_info=True)
+
+    async def _wait(self, waiter, on_position):
+        while True:
+            if on_position and waiter.position != waiter.reported:
+                waiter.reported = waiter.position
+                await self._notify(on_position, waiter.reported)
+                if waiter.granted.done():
+                    return
+                # Throttle edits so a fast-moving queue doesn't hit rate limits
+                await asyncio.wait([waiter.granted], timeout=self.update_interval)
+                if waiter.granted.done():
+                    return
+
+            waiter.moved.clear()
+            moved = asyncio.ensure_future(waiter.moved.wait())
+            try:
+                await asyncio.wait([waiter.granted, moved], return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                moved.cancel()
+            if waiter.granted.done():
+                return
+
+    @asynccontextmanager
+    async def slot(self, user_id, guild_id=None, on_position=None):
+        """
+        Hold a job slot for the duration of the block. Raises QueueFull if the
+        request has to wait and the queue (or the user's share of it) is full.
+
+        `on_position` is an optional async callable that is given the queue
+        position while waiting and None once a request that had to wait starts.
+        """
+        waiter = _Waiter(guild_id, user_id)
+
+        if self.running < self.max_running and self._user_can_run(user_id) and not self._queued:
+            self._take(waiter)
+        else:
+            if self._queued >= self.max_queued:
+                QUEUE_REJECTED.inc(reason="queue_full")
+                raise QueueFull("The bot is busy right now. Please try again in a minute.")
+            if self._queued_by_user.get(user_id, 0) >= self.max_queued_per_user:
+                QUEUE_REJECTED.inc(reason="user_limit")
+                raise QueueFull("You already have the maximum number of maps waiting. Please wait for them to finish.")
+
+            self._enqueue(waiter)
+            self._dispatch()
+            try:
+                with QUEUE_WAIT_SECONDS.time(), tracing.span("queue", position=waiter.position):
+                    await self._wait(waiter, on_position)
+            except BaseException:
+                if waiter.granted.done():
+                    self._release(user_id)
+                else:
+                    waiter.granted.cancel()
+                    self._remove(waiter)
+                    self._dispatch()
+                raise
+
+        try:
+            if waiter.reported is not None:
+                await self._notify(on_position, None)
+            yield
+        finally:
+            self._release(user_id)
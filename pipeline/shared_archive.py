@@ -0,0 +1,123 @@
+import io
+from multiprocessing import shared_memory
+
+COPY_CHUNK_BYTES = 1024 * 1024
+
+
+class MemoryReader(io.RawIOBase):
+    """Seekable read-only file over a buffer that copies only the bytes actually read."""
+
+    def __init__(self, buffer):
+        super().__init__()
+        self._buf = memoryview(buffer)
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = len(self._buf) + offset
+        else:
+            raise ValueError(f"Invalid whence ({whence})")
+        if pos < 0:
+            raise ValueError("Negative seek position")
+        self._pos = pos
+        return pos
+
+    def readinto(self, buffer):
+        size = min(len(buffer), len(self._buf) - self._pos)
+        if size <= 0:
+            return 0
+        buffer[:size] = self._buf[self._pos:self._pos + size]
+        self._pos += size
+        return size
+
+    def close(self):
+        # Exported views keep the shared memory block from being closed
+        if not self.closed:
+            self._buf.release()
+        super().close()
+
+
+class SharedArchive:
+    """
+    Picklable handle to archive bytes held in a shared memory block.
+
+    The creating process owns the block and unlinks it in `release()`;
+    workers `open()` it to get a reader over the same memory without the
+    bytes ever being pickled.
+    """
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+        self._shm = None
+
+    @classmethod
+    def from_file(cls, fileobj):
+        """Copy a seekable file into a new shared memory block."""
+        size = fileobj.seek(0, io.SEEK_END)
+        fileobj.seek(0)
+        # Zero-sized blocks can't be created
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        try:
+            pos = 0
+            while pos < size:
+                chunk = fileobj.read(min(COPY_CHUNK_BYTES, size - pos))
+                if not chunk:
+                    raise EOFError("Archive ended before its reported size")
+                shm.buf[pos:pos + len(chunk)] = chunk
+                pos += len(chunk)
+        except BaseException:
+            shm.close()
+            shm.unlink()
+            raise
+
+        archive = cls(shm.name, size)
+        archive._shm = shm
+        return archive
+
+    def __getstate__(self):
+        return {"name": self.name, "size": self.size}
+
+    def __setstate__(self, state):
+        self.name = state["name"]
+        self.size = state["size"]
+        self._shm = None
+
+    def open(self):
+        """Attach to the block and return a reader over the archive bytes."""
+        shm = shared_memory.SharedMemory(name=self.name)
+        return _SharedReader(shm, self.size)
+
+    def release(self):
+        if self._shm is not None:
+            self._shm.close()
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+            self._shm = None
+
+
+class _SharedReader(MemoryReader):
+
+    def __init__(self, shm, size):
+        super().__init__(shm.buf[:size])
+        self._shm = shm
+
+    def close(self):
+        if not self.closed:
+            super().close()
+            self._shm.close()
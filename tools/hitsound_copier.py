@@ -2,6 +2,9 @@ import json
 import zipfile
 from io import BytesIO
 
+import config
+from utils.archive_limits import check_archive_limits, over_budget
+
 
 TIME_TOLERANCE_MS = 5
 
@@ -51,27 +54,50 @@ def _extract_sound_events(notes):
     return events
 
 
-def _find_closest_event(events, target_time, tolerance=TIME_TOLERANCE_MS):
-    if not events or target_time is None:
-        return None
-    
-    closest = None
-    closest_diff = float('inf')
-    
-    for time, sounds, volume, sample_set, hold_data in events:
-        if time is None:
-            continue
-        diff = abs(time - target_time)
-        if diff <= tolerance and diff < closest_diff:
-            closest = (sounds, volume, sample_set, hold_data)
-            closest_diff = diff
-    
-    return closest
+def _match_events(events, times, tolerance=TIME_TOLERANCE_MS):
+    """
+    Find the closest event within tolerance of each of `times`, in one merge
+    pass over the events (sorted by _extract_sound_events) and the times in
+    sorted order. Returns (sounds, volume, sample_set, hold_data) or None per
+    time, in the order of `times`. Ties go to the earlier event, as they did
+    with a linear scan.
+    """
+    event_times = [time for time, *_ in events if time is not None]
+    payloads = [tuple(event[1:]) for event in events if event[0] is not None]
+    matches = [None] * len(times)
+    # Charts list their notes in time order, which timsort handles in one pass
+    order = sorted((i for i, time in enumerate(times) if time is not None), key=times.__getitem__)
+
+    low = 0
+    for i in order:
+        target = times[i]
+        while low < len(event_times) and target - event_times[low] > tolerance:
+            low += 1
+
+        closest = None
+        closest_diff = None
+        j = low
+        while j < len(event_times) and event_times[j] - target <= tolerance:
+            diff = abs(event_times[j] - target)
+            if closest_diff is None or diff < closest_diff:
+                closest = j
+                closest_diff = diff
+            j += 1
+
+        if closest is not None:
+            matches[i] = payloads[closest]
+
+    return matches
 
 
 def copy_hitsounds(zip_bytes, source_difficulty_name, ignore_tapvolumes=False, ignore_holdvolumes=False):
     try:
         with zipfile.ZipFile(zip_bytes, 'r') as z:
+            # Every member is held in memory to write the new archive, so there's nothing to skip
+            total_bytes = check_archive_limits(z)
+            if config.MAX_UNCOMPRESSED_BYTES and total_bytes > config.MAX_UNCOMPRESSED_BYTES:
+                raise over_budget(total_bytes)
+            
             meta = None
             difficulties = {}
             other_files = {}
@@ -109,13 +135,19 @@ def copy_hitsounds(zip_bytes, source_difficulty_name, ignore_tapvolumes=False, i
                 if filename == source_filename:
                     continue
                 
-                for note in diff_data.get("notes", []):
+                notes = diff_data.get("notes", [])
+                times = []
+                for note in notes:
                     if note.get("type") == "hold":
-                        start_time = note.get("startTime")
-                        end_time = note.get("endTime")
-                        
-                        start_match = _find_closest_event(source_events, start_time)
-                        end_match = _find_closest_event(source_events, end_time)
+                        times.extend((note.get("startTime"), note.get("endTime")))
+                    else:
+                        times.append(note.get("time"))
+                matches = iter(_match_events(source_events, times))
+                
+                for note in notes:
+                    if note.get("type") == "hold":
+                        start_match = next(matches)
+                        end_match = next(matches)
                         
                         if start_match or end_match:
                             if "hitsound" not in note:
@@ -161,8 +193,7 @@ def copy_hitsounds(zip_bytes, source_difficulty_name, ignore_tapvolumes=False, i
                                 hitsound["end"] = end_data
                                 modified_count += 1
                     else:
-                        tap_time = note.get("time")
-                        match = _find_closest_event(source_events, tap_time)
+                        match = next(matches)
                         
                         if match:
                             sounds, volume, sample_set, _ = match
@@ -0,0 +1,48 @@
+import config
+from utils.ingest import ArchiveTooLarge
+
+
+class ArchiveOverBudget(ArchiveTooLarge):
+    """The archive would unpack to more than the bot is willing to hold in memory."""
+
+
+def _mb(size):
+    return f"{size / (1024 * 1024):.0f} MB"
+
+
+def check_archive_limits(z, max_members=None, max_json_bytes=None):
+    """
+    Vet a ZipFile's central directory before anything is decompressed. zipfile
+    never inflates a member past its declared size, so these sizes bound what
+    reading the archive can cost, however well its members compress (a silent
+    WAV legitimately shrinks a thousandfold).
+
+    Raises ArchiveOverBudget for archives with too many members and for beatmap
+    JSON too large to parse. Returns the total uncompressed size for the caller
+    to budget against.
+    """
+    max_members = config.MAX_ARCHIVE_MEMBERS if max_members is None else max_members
+    max_json_bytes = config.MAX_JSON_BYTES if max_json_bytes is None else max_json_bytes
+
+    infos = z.infolist()
+    if max_members and len(infos) > max_members:
+        raise ArchiveOverBudget(f"The map file contains {len(infos)} files, more than the limit of {max_members}.")
+
+    total = 0
+    json_total = 0
+    for info in infos:
+        total += info.file_size
+        if info.filename.endswith(".json"):
+            json_total += info.file_size
+
+    if max_json_bytes and json_total > max_json_bytes:
+        raise ArchiveOverBudget(
+            f"The map's difficulty files unpack to {_mb(json_total)}, more than the {_mb(max_json_bytes)} limit."
+        )
+    return total
+
+
+def over_budget(total, budget=None):
+    """The error to raise when work that needs the whole archive in memory can't be downgraded."""
+    budget = config.MAX_UNCOMPRESSED_BYTES if budget is None else budget
+    return ArchiveOverBudget(f"The map file unpacks to {_mb(total)}, more than the {_mb(budget)} that can be processed.")
@@ -11,3 +11,13 @@ def embed_generate(type, title, description=None):
     color = EMBED_COLORS.get(type, 0x5865F2)
     return discord.Embed(title=title, description=description, color=color)
 
+
+def queue_position_updater(interaction):
+    """Build a JobScheduler on_position callback that shows the queue position in the deferred response."""
+    async def update(position):
+        if position is None:
+            embed = embed_generate(type="info", title="Processing", description="Your map is being processed...")
+        else:
+            embed = embed_generate(type="info", title="Queued", description=f"Your map is **#{position}** in the queue. This message updates as it moves.")
+        await interaction.edit_original_response(embed=embed)
+    return update
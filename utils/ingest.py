@@ -0,0 +1,74 @@
+import tempfile
+
+import config
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ArchiveTooLarge(ValueError):
+
+    @classmethod
+    def for_limit(cls, max_bytes):
+        return cls(f"The map file is larger than the {max_bytes / (1024 * 1024):.0f} MB limit.")
+
+
+async def ingest_chunks(chunks, max_bytes=None, spool_bytes=None):
+    """
+    Stream an async iterator of byte chunks into a spooled temporary file and
+    return it rewound. Small archives stay in memory, large ones roll over to
+    disk, and the stream is abandoned as soon as it passes `max_bytes`.
+    """
+    max_bytes = config.MAX_ARCHIVE_BYTES if max_bytes is None else max_bytes
+    spool_bytes = config.SPOOL_MEMORY_BYTES if spool_bytes is None else spool_bytes
+
+    spooled = tempfile.SpooledTemporaryFile(max_size=spool_bytes)
+    total = 0
+    try:
+        async for chunk in chunks:
+            total += len(chunk)
+            if max_bytes and total > max_bytes:
+                raise ArchiveTooLarge.for_limit(max_bytes)
+            spooled.write(chunk)
+    except BaseException:
+        spooled.close()
+        raise
+
+    spooled.seek(0)
+    return spooled
+
+
+async def ingest_response(response, max_bytes=None, spool_bytes=None):
+    """Ingest an aiohttp response body, rejecting an oversize Content-Length up front."""
+    max_bytes = config.MAX_ARCHIVE_BYTES if max_bytes is None else max_bytes
+    if max_bytes and response.content_length and response.content_length > max_bytes:
+        raise ArchiveTooLarge.for_limit(max_bytes)
+    return await ingest_chunks(response.content.iter_chunked(CHUNK_SIZE), max_bytes, spool_bytes)
+
+
+async def read_response(response, max_bytes):
+    """
+    Read a small aiohttp response body of at most `max_bytes`, such as a
+    range, into memory. Like ingest_response it rejects an oversize
+    Content-Length up front and stops reading as soon as the body passes it.
+    """
+    too_large = ArchiveTooLarge(f"The server sent more than the {max_bytes} bytes that were asked for.")
+    if response.content_length and response.content_length > max_bytes:
+        raise too_large
+    body = bytearray()
+    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+        body += chunk
+        if len(body) > max_bytes:
+            raise too_large
+    return bytes(body)
+
+
+async def ingest_attachment(session, attachment, max_bytes=None, spool_bytes=None):
+    """Stream a Discord attachment from its CDN URL instead of reading it into memory."""
+    max_bytes = config.MAX_ARCHIVE_BYTES if max_bytes is None else max_bytes
+    if max_bytes and attachment.size > max_bytes:
+        raise ArchiveTooLarge.for_limit(max_bytes)
+
+    async with session.get(attachment.url) as resp:
+        if resp.status != 200:
+            raise RuntimeError(f"Failed to download attachment: HTTP {resp.status}")
+        return await ingest_response(resp, max_bytes, spool_bytes)
@@ -0,0 +1,401 @@
+import io
+import struct
+import zipfile
+from PIL import Image
+from mutagen import File as MutagenFile
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Start-of-frame markers carry the image dimensions. C4 (DHT), C8 (JPG) and
+# CC (DAC) share the range but are not frames.
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+JPEG_STANDALONE_MARKERS = {0x01, *range(0xD0, 0xD8)}
+
+# Largest container header (MP4 moov box / WebM Info or Tracks element) that
+# will be read into memory.
+MAX_VIDEO_HEADER_BYTES = 16 * 1024 * 1024
+
+EBML_SEGMENT = 0x18538067
+EBML_INFO = 0x1549A966
+EBML_TRACKS = 0x1654AE6B
+EBML_CLUSTER = 0x1F43B675
+
+
+class StoredMemberReader(io.RawIOBase):
+    """
+    Seekable view over an uncompressed zip member that reads straight from the
+    archive, so seeking (e.g. to an audio footer) never reads the bytes in between.
+    """
+
+    def __init__(self, archive_fp, info):
+        super().__init__()
+        self.name = info.filename
+        self._fp = archive_fp
+        self._size = info.file_size
+        self._pos = 0
+
+        archive_fp.seek(info.header_offset)
+        header = archive_fp.read(zipfile.sizeFileHeader)
+        if len(header) != zipfile.sizeFileHeader or header[:4] != zipfile.stringFileHeader:
+            raise zipfile.BadZipFile(f"Bad local file header for {info.filename}")
+        name_length, extra_length = struct.unpack("<HH", header[26:30])
+        self._data_start = info.header_offset + zipfile.sizeFileHeader + name_length + extra_length
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError(f"Invalid whence ({whence})")
+        self._pos = min(max(pos, 0), self._size)
+        return self._pos
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self._size - self._pos)
+        if size <= 0:
+            return 0
+        self._fp.seek(self._data_start + self._pos)
+        data = self._fp.read(size)
+        buffer[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+
+def is_random_access(info):
+    return info.compress_type == zipfile.ZIP_STORED and not info.flag_bits & 0x1
+
+
+def open_member(z, info):
+    """
+    Open a zip member for probing. Stored members get a true random-access
+    reader; compressed ones fall back to the regular (forward-decompressing)
+    ZipExtFile.
+    """
+    if is_random_access(info):
+        return io.BufferedReader(StoredMemberReader(z.fp, info))
+    return z.open(info)
+
+
+def _read_exact(fp, size):
+    data = fp.read(size)
+    if len(data) != size:
+        raise EOFError("Unexpected end of stream")
+    return data
+
+
+def _skip(fp, size):
+    if fp.seekable():
+        fp.seek(size, 1)
+    else:
+        _read_exact(fp, size)
+
+
+def _probe_png(fp):
+    # IHDR is always the first chunk: length(4) type(4) width(4) height(4)
+    length, chunk_type, width, height = struct.unpack(">I4sII", _read_exact(fp, 16))
+    if chunk_type != b"IHDR":
+        return None
+    return width, height
+
+
+def _probe_jpeg(fp):
+    while True:
+        byte = _read_exact(fp, 1)
+        if byte != b"\xff":
+            return None
+
+        marker = _read_exact(fp, 1)[0]
+        while marker == 0xFF:
+            marker = _read_exact(fp, 1)[0]
+
+        if marker in JPEG_STANDALONE_MARKERS:
+            continue
+        if marker in (0xD9, 0xDA):
+            # End of image or start of scan before any frame header
+            return None
+
+        length = struct.unpack(">H", _read_exact(fp, 2))[0]
+        if length < 2:
+            return None
+
+        if marker in JPEG_SOF_MARKERS:
+            _, height, width = struct.unpack(">BHH", _read_exact(fp, 5))
+            return width, height
+
+        _skip(fp, length - 2)
+
+
+def probe_image_size(fp):
+    """
+    Return (width, height) of the image in `fp` by reading only its header.
+
+    JPEG and PNG are parsed directly; any other format is handed to PIL, which
+    also only decodes as much as it needs to report the size.
+    """
+    start = fp.tell()
+    header = fp.read(8)
+
+    size = None
+    try:
+        if header == PNG_SIGNATURE:
+            size = _probe_png(fp)
+        elif header[:2] == b"\xff\xd8":
+            fp.seek(start + 2)
+            size = _probe_jpeg(fp)
+    except (EOFError, struct.error):
+        size = None
+
+    if size:
+        return size
+
+    fp.seek(start)
+    with Image.open(fp) as img:
+        return img.width, img.height
+
+
+def probe_audio(fp, size_bytes):
+    """
+    Return the duration (seconds) and bitrate (kbps) of the audio in `fp`.
+
+    The bitrate comes from the codec header when mutagen reports one, otherwise
+    it is estimated from the file size.
+    """
+    audio_file = MutagenFile(fp)
+    # FileType is a mapping of tags, so an untagged file is falsy
+    info = audio_file.info if audio_file is not None else None
+    duration = info.length if info else None
+
+    bitrate = None
+    header_bitrate = getattr(info, "bitrate", 0) if info else 0
+    if header_bitrate:
+        bitrate = header_bitrate / 1000  # kbps
+    elif duration and duration > 0:
+        bitrate = (size_bytes * 8 / duration) / 1000
+
+    return {
+        "duration": duration,
+        "bitrate": round(bitrate, 1) if bitrate else None
+    }
+
+
+def _iter_mp4_boxes(data, offset=0, end=None):
+    end = len(data) if end is None else end
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", data, offset)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header or offset + size > end:
+            return
+        yield box_type, offset + header, offset + size
+        offset += size
+
+
+def _find_mp4_moov(fp, size_bytes, max_skip):
+    offset = 0
+    skipped = 0
+    while offset + 8 <= size_bytes:
+        fp.seek(offset)
+        size, box_type = struct.unpack(">I4s", _read_exact(fp, 8))
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", _read_exact(fp, 8))[0]
+            header = 16
+        elif size == 0:
+            size = size_bytes - offset
+        if size < header:
+            return None
+
+        if box_type == b"moov":
+            if size - header > MAX_VIDEO_HEADER_BYTES:
+                return None
+            return _read_exact(fp, size - header)
+
+        skipped += size
+        if max_skip is not None and skipped > max_skip:
+            # moov sits behind the media data and the stream can't seek past it
+            return None
+        offset += size
+    return None
+
+
+def _parse_mp4_moov(moov):
+    info = {"width": None, "height": None, "duration": None}
+
+    for box_type, start, end in _iter_mp4_boxes(moov):
+        if box_type == b"mvhd":
+            version = moov[start]
+            if version == 1:
+                timescale, duration = struct.unpack_from(">IQ", moov, start + 20)
+            else:
+                timescale, duration = struct.unpack_from(">II", moov, start + 12)
+            if timescale:
+                info["duration"] = duration / timescale
+
+        elif box_type == b"trak" and info["width"] is None:
+            track_size = None
+            handler = None
+            for child_type, child_start, child_end in _iter_mp4_boxes(moov, start, end):
+                if child_type == b"tkhd":
+                    # Width and height are 16.16 fixed point, last in the box
+                    width, height = struct.unpack_from(">II", moov, child_end - 8)
+                    track_size = (width >> 16, height >> 16)
+                elif child_type == b"mdia":
+                    for mdia_type, mdia_start, _ in _iter_mp4_boxes(moov, child_start, child_end):
+                        if mdia_type == b"hdlr":
+                            handler = moov[mdia_start + 8:mdia_start + 12]
+            if handler == b"vide" and track_size:
+                info["width"], info["height"] = track_size
+
+    return info
+
+
+def _read_vint(fp, keep_marker=False):
+    """Read an EBML variable-length integer. Returns (value, all_data_bits_set)."""
+    first = _read_exact(fp, 1)[0]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first & mask:
+        mask >>= 1
+        length += 1
+    if length > 8:
+        raise ValueError("Invalid EBML variable-length integer")
+
+    value = first if keep_marker else first & (mask - 1)
+    all_ones = first & (mask - 1) == mask - 1
+    for byte in _read_exact(fp, length - 1):
+        value = (value << 8) | byte
+        all_ones = all_ones and byte == 0xFF
+    return value, all_ones
+
+
+def _read_ebml_element(fp):
+    """Read an element header. Returns (id, size), with size None if unknown."""
+    element_id, _ = _read_vint(fp, keep_marker=True)
+    size, unknown = _read_vint(fp)
+    return element_id, (None if unknown else size)
+
+
+def _iter_ebml_children(data):
+    fp = io.BytesIO(data)
+    while fp.tell() < len(data):
+        element_id, size = _read_ebml_element(fp)
+        if size is None:
+            return
+        yield element_id, fp.read(size)
+
+
+def _ebml_uint(data):
+    return int.from_bytes(data, "big")
+
+
+def _ebml_float(data):
+    if len(data) == 4:
+        return struct.unpack(">f", data)[0]
+    if len(data) == 8:
+        return struct.unpack(">d", data)[0]
+    return None
+
+
+def _parse_webm(fp, max_skip):
+    info = {"width": None, "height": None, "duration": None}
+
+    element_id, size = _read_ebml_element(fp)
+    if element_id != 0x1A45DFA3 or size is None:
+        return None
+    _skip(fp, size)
+
+    element_id, segment_size = _read_ebml_element(fp)
+    if element_id != EBML_SEGMENT:
+        return None
+    segment_end = None if segment_size is None else fp.tell() + segment_size
+
+    timecode_scale = 1000000
+    duration = None
+    skipped = 0
+    while segment_end is None or fp.tell() < segment_end:
+        try:
+            element_id, size = _read_ebml_element(fp)
+        except EOFError:
+            break
+        if element_id == EBML_CLUSTER or size is None:
+            break
+
+        if element_id in (EBML_INFO, EBML_TRACKS):
+            if size > MAX_VIDEO_HEADER_BYTES:
+                break
+            data = _read_exact(fp, size)
+            if element_id == EBML_INFO:
+                for child_id, value in _iter_ebml_children(data):
+                    if child_id == 0x2AD7B1:
+                        timecode_scale = _ebml_uint(value)
+                    elif child_id == 0x4489:
+                        duration = _ebml_float(value)
+            else:
+                for entry_id, entry in _iter_ebml_children(data):
+                    if entry_id != 0xAE or info["width"] is not None:
+                        continue
+                    track = dict(_iter_ebml_children(entry))
+                    if _ebml_uint(track.get(0x83, b"")) != 1 or 0xE0 not in track:
+                        continue
+                    video = dict(_iter_ebml_children(track[0xE0]))
+                    if 0xB0 in video and 0xBA in video:
+                        info["width"] = _ebml_uint(video[0xB0])
+                        info["height"] = _ebml_uint(video[0xBA])
+        else:
+            skipped += size
+            if max_skip is not None and skipped > max_skip:
+                break
+            _skip(fp, size)
+
+    if duration is not None:
+        info["duration"] = duration * timecode_scale / 1e9
+
+    return info
+
+
+def probe_video(fp, size_bytes, max_skip=None):
+    """
+    Return the resolution, duration (seconds) and bitrate (kbps) of an MP4 or
+    WebM stream by reading only its container headers (the MP4 moov box or the
+    WebM Info/Tracks elements).
+
+    `max_skip` bounds how many bytes may be skipped while looking for them,
+    for streams where seeking forward means decompressing everything between.
+    Fields that can't be determined are None.
+    """
+    info = None
+    try:
+        header = fp.read(8)
+        fp.seek(0)
+        if header[:4] == b"\x1a\x45\xdf\xa3":
+            info = _parse_webm(fp, max_skip)
+        elif header[4:8] in (b"ftyp", b"moov", b"mdat", b"free", b"wide", b"skip"):
+            moov = _find_mp4_moov(fp, size_bytes, max_skip)
+            if moov:
+                info = _parse_mp4_moov(moov)
+    except (EOFError, ValueError, struct.error):
+        info = None
+
+    info = info or {"width": None, "height": None, "duration": None}
+
+    bitrate = None
+    if info["duration"]:
+        bitrate = round((size_bytes * 8 / info["duration"]) / 1000, 1)
+
+    return {**info, "bitrate": bitrate}
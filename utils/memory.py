@@ -0,0 +1,176 @@
+"""
+Peak memory of each stage of a job.
+
+By default a stage's peak is the growth of the worker process's peak resident
+set size: on Linux the kernel's high-water mark (VmHWM) can be reset through
+/proc/self/clear_refs, which makes measuring a stage two small file
+operations. That is a process-wide number. Workers run one job at a time, but
+it includes whatever else the process does meanwhile, such as the job's check
+threads, and is labelled "process_rss" wherever it is reported.
+MEMORY_ACCOUNTING=tracemalloc counts Python allocations instead ("tracemalloc"),
+which is exact but slows jobs several times over; "off" disables it.
+"""
+import logging
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+import config
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+STAGE_PEAK_BYTES = metrics.histogram(
+    "rtbot_stage_peak_bytes",
+    "Peak memory growth during each job stage, as measured by `meter` (process_rss is process-wide)",
+    ("stage", "meter"),
+    buckets=tuple(size * MB for size in (1, 4, 16, 64, 256, 512, 1024, 2048))
+)
+
+_state = threading.local()
+_rss_unavailable = False
+
+
+class _RssMeter:
+
+    name = "process_rss"
+
+    def current(self):
+        return self._status("VmRSS:")
+
+    def peak(self):
+        return self._status("VmHWM:")
+
+    def reset_peak(self):
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+
+    def close(self):
+        pass
+
+    def _status(self, field):
+        with open("/proc/self/status", "rb") as f:
+            for line in f:
+                if line.startswith(field.encode()):
+                    return int(line.split()[1]) * 1024
+        raise OSError(f"{field} missing from /proc/self/status")
+
+
+class _TracemallocMeter:
+
+    name = "tracemalloc"
+
+    def __init__(self):
+        self._started = not tracemalloc.is_tracing()
+        if self._started:
+            tracemalloc.start()
+
+    def current(self):
+        return tracemalloc.get_traced_memory()[0]
+
+    def peak(self):
+        return tracemalloc.get_traced_memory()[1]
+
+    def reset_peak(self):
+        tracemalloc.reset_peak()
+
+    def close(self):
+        if self._started:
+            tracemalloc.stop()
+
+
+def _open_meter():
+    global _rss_unavailable
+    if config.MEMORY_ACCOUNTING == "tracemalloc":
+        return _TracemallocMeter()
+    if config.MEMORY_ACCOUNTING != "rss" or _rss_unavailable:
+        return None
+    meter = _RssMeter()
+    try:
+        meter.reset_peak()
+        meter.peak()
+    except (OSError, ValueError) as e:
+        _rss_unavailable = True
+        logger.warning(f"Peak RSS can't be measured here ({e}), memory accounting is off")
+        return None
+    return meter
+
+
+class _Frame:
+
+    def __init__(self, start, meter=None):
+        self.start = start
+        self.peak = start
+        self.meter = meter
+        self.bytes = None
+
+
+class Peaks(dict):
+    """{stage: peak bytes}, with the name of the `meter` that measured them."""
+
+    def __init__(self, meter=None):
+        super().__init__()
+        self.meter = meter
+
+
+@contextmanager
+def track(name):
+    """
+    Record the peak memory growth of the block under `name`, if the thread is
+    inside `accounting`. Yields a frame whose `bytes` is set on exit and whose
+    `meter` names what it measures.
+    """
+    meter = getattr(_state, "meter", None)
+    if meter is None:
+        yield _Frame(0)
+        return
+
+    stack = _state.stack
+    # Resetting the high-water mark loses the enclosing stage's peak so far
+    peak = meter.peak()
+    if stack:
+        stack[-1].peak = max(stack[-1].peak, peak)
+    meter.reset_peak()
+    frame = _Frame(meter.current(), meter.name)
+    stack.append(frame)
+    try:
+        yield frame
+    finally:
+        frame.peak = max(frame.peak, meter.peak())
+        stack.pop()
+        if stack:
+            stack[-1].peak = max(stack[-1].peak, frame.peak)
+        frame.bytes = max(frame.peak - frame.start, 0)
+        _state.peaks[name] = max(_state.peaks.get(name, 0), frame.bytes)
+
+
+@contextmanager
+def accounting(name):
+    """
+    Measure stages for the duration of the block, with the block itself
+    tracked as `name`. Yields Peaks, filled in as stages end.
+    """
+    meter = _open_meter()
+    if meter is None:
+        yield Peaks()
+        return
+
+    peaks = Peaks(meter.name)
+    _state.meter = meter
+    _state.stack = []
+    _state.peaks = peaks
+    try:
+        with track(name):
+            yield peaks
+    finally:
+        _state.meter = None
+        meter.close()
+        for stage, peak in peaks.items():
+            STAGE_PEAK_BYTES.observe(peak, stage=stage, meter=meter.name)
+
+
+def format_peaks(peaks):
+    stages = ", ".join(f"{stage} {peak / MB:.1f} MB" for stage, peak in peaks.items())
+    return f"{stages} ({peaks.meter})" if getattr(peaks, "meter", None) else stages
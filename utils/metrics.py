@@ -0,0 +1,274 @@
+"""
+In-process counters, gauges and histograms, exposed in the Prometheus text
+format on a small aiohttp server running on the bot's event loop.
+
+Recording a value is a dict lookup and an addition under a lock. Worker
+processes record into a capture buffer instead (see `capture`), which
+JobExecutor ships back with the job's result and replays here.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers a cached check up to a job hitting its timeout
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_capture = threading.local()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        try:
+            return tuple(labels[name] for name in self.labelnames)
+        except KeyError as e:
+            raise ValueError(f"Metric {self.name} needs label {e}") from None
+
+    def _captured(self, method, value, labels):
+        buffer = getattr(_capture, "buffer", None)
+        if buffer is None:
+            return False
+        buffer.append((self.name, method, value, labels))
+        return True
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if self._captured("inc", amount, labels):
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    """A value that is set directly, or read from `func` whenever metrics are scraped."""
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), func=None):
+        super().__init__(name, help, labels)
+        self.func = func
+
+    def set(self, value, **labels):
+        if self._captured("set", value, labels):
+            return
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def render(self):
+        if self.func is not None:
+            try:
+                items = [((), self.func())]
+            except Exception:
+                logger.warning(f"Could not read gauge {self.name}", exc_info=True)
+                items = []
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        if self._captured("observe", value, labels):
+            return
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), sum, count
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the block took, in seconds, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        series = self._values.get(self._key(labels))
+        return series[2] if series else 0
+
+    def render(self):
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        lines = self._header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                raise ValueError(f"Metric {metric.name} is already registered differently")
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def replay(self, samples):
+        """Apply samples recorded under `capture` in another process."""
+        for name, method, value, labels in samples:
+            metric = self._metrics.get(name)
+            if metric is None:
+                continue
+            try:
+                getattr(metric, method)(value, **labels)
+            except (AttributeError, ValueError):
+                logger.warning(f"Dropped captured sample for metric {name}")
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name, help, labels=()):
+    return REGISTRY.register(Counter(name, help, labels))
+
+
+def gauge(name, help, labels=(), func=None):
+    metric = REGISTRY.register(Gauge(name, help, labels, func))
+    if func is not None:
+        # The latest owner wins, e.g. a scheduler created after an earlier one
+        metric.func = func
+    return metric
+
+
+def histogram(name, help, labels=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, help, labels, buckets))
+
+
+@contextmanager
+def capture():
+    """Buffer every sample recorded on this thread instead of applying it. Yields the buffer."""
+    previous = getattr(_capture, "buffer", None)
+    _capture.buffer = []
+    try:
+        yield _capture.buffer
+    finally:
+        _capture.buffer = previous
+
+
+# Shared by the cogs, the pipeline and the checks
+STAGE_SECONDS = histogram(
+    "rtbot_stage_seconds", "Time spent in each stage of a command", ("command", "stage")
+)
+CHECK_SECONDS = histogram(
+    "rtbot_check_seconds", "Time spent running each check (cached results aren't counted)", ("check",)
+)
+CACHE_REQUESTS = counter(
+    "rtbot_cache_requests_total", "Cache lookups by cache and outcome (hit or miss)", ("cache", "result")
+)
+COMMANDS = counter(
+    "rtbot_commands_total", "Finished commands by outcome", ("command", "outcome")
+)
+
+
+class MetricsServer:
+    """Serves REGISTRY at /metrics from the running event loop."""
+
+    def __init__(self, registry=REGISTRY):
+        self.registry = registry
+        self.app = web.Application()
+        self.app.router.add_get("/metrics", self.handle)
+        self._runner = None
+
+    async def handle(self, request):
+        return web.Response(
+            body=self.registry.render().encode("utf-8"),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+        )
+
+    async def start(self, host, port):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info(f"Serving metrics at http://{host}:{self._runner.addresses[0][1]}/metrics")
+
+    async def close(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
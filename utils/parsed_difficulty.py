@@ -0,0 +1,138 @@
+from functools import cached_property
+
+import numpy as np
+
+NOTE_TAP = 0
+NOTE_HOLD = 1
+NOTE_OTHER = 2
+
+SOUND_CLAP = 1
+SOUND_WHISTLE = 2
+SOUND_FINISH = 4
+
+# Gaps between events at least this long don't count towards drain time
+DRAIN_GAP_MS = 5000
+
+
+def pack_sounds(sounds):
+    """Pack a hitsound `sounds` mapping into SOUND_* bit flags (0 when nothing is active)."""
+    if not sounds:
+        return 0
+    return (
+        (SOUND_CLAP if sounds.get("hitclap", False) else 0)
+        | (SOUND_WHISTLE if sounds.get("hitwhistle", False) else 0)
+        | (SOUND_FINISH if sounds.get("hitfinish", False) else 0)
+    )
+
+
+def _time(value):
+    return np.nan if value is None else value
+
+
+class ParsedDifficulty:
+    """
+    Column-oriented view of one difficulty, built once from its JSON and shared
+    by every check.
+
+    Per note: `types` (NOTE_*), `start` and `end` (a tap's time in both, a
+    hold's start and end time; NaN when missing), packed `sounds` and `volume`
+    of the tap or hold start, `end_sounds`/`end_volume` of a hold end and the
+    hold loop `hold_volume`. Values derived from them are computed on first use.
+    """
+
+    def __init__(self, difficulty):
+        self.difficulty = difficulty
+        self.data = difficulty.get("data", {})
+        self.filename = difficulty.get("filename", "Unknown")
+        self.name = self.data.get("name", self.filename)
+        self.typing_sections = self.data.get("typingSections", [])
+
+        notes = self.data.get("notes", [])
+        types = []
+        start = []
+        end = []
+        sounds = []
+        volume = []
+        end_sounds = []
+        end_volume = []
+        hold_volume = []
+
+        for note in notes:
+            hitsound = note.get("hitsound") or {}
+            if note.get("type") == "hold":
+                types.append(NOTE_HOLD)
+                start.append(_time(note.get("startTime")))
+                end.append(_time(note.get("endTime")))
+                start_hs = hitsound.get("start") or {}
+                end_hs = hitsound.get("end") or {}
+                sounds.append(pack_sounds(start_hs.get("sounds")))
+                volume.append(start_hs.get("volume", 100))
+                end_sounds.append(pack_sounds(end_hs.get("sounds")))
+                end_volume.append(end_hs.get("volume", 100))
+                hold_volume.append((hitsound.get("hold") or {}).get("volume", 0))
+            else:
+                types.append(NOTE_TAP if note.get("type") == "tap" else NOTE_OTHER)
+                time = _time(note.get("time"))
+                start.append(time)
+                end.append(time)
+                sounds.append(pack_sounds(hitsound.get("sounds")))
+                volume.append(hitsound.get("volume", 100))
+                end_sounds.append(0)
+                end_volume.append(0)
+                hold_volume.append(0)
+
+        self.types = np.array(types, dtype=np.int8)
+        self.start = np.array(start, dtype=np.float64)
+        self.end = np.array(end, dtype=np.float64)
+        self.sounds = np.array(sounds, dtype=np.uint8)
+        self.volume = np.array(volume, dtype=np.float64)
+        self.end_sounds = np.array(end_sounds, dtype=np.uint8)
+        self.end_volume = np.array(end_volume, dtype=np.float64)
+        self.hold_volume = np.array(hold_volume, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.types)
+
+    @cached_property
+    def is_tap(self):
+        return self.types == NOTE_TAP
+
+    @cached_property
+    def is_hold(self):
+        return self.types == NOTE_HOLD
+
+    @cached_property
+    def event_times(self):
+        """Sorted times of every tap and hold edge, with missing times counted as 0."""
+        holds = self.is_hold
+        times = np.concatenate((self.start, self.end[holds]))
+        return np.sort(np.nan_to_num(times, nan=0.0))
+
+    @cached_property
+    def sound_events(self):
+        """
+        (times, sounds) of every tap and hold edge that has a time, in note
+        order with a hold's start before its end.
+        """
+        holds = self.is_hold
+        times = np.column_stack((self.start, np.where(holds, self.end, np.nan))).ravel()
+        sounds = np.column_stack((self.sounds, np.where(holds, self.end_sounds, 0))).ravel()
+        present = ~np.isnan(times)
+        return times[present], sounds[present]
+
+    @cached_property
+    def drain_time(self):
+        """Playable length in ms: first to last event minus long breaks, plus typing sections."""
+        if not len(self) and not self.typing_sections:
+            return 0
+
+        drain = 0.0
+        times = self.event_times
+        if len(times) >= 2:
+            gaps = np.diff(times)
+            drain = float(times[-1] - times[0] - gaps[gaps >= DRAIN_GAP_MS].sum())
+
+        for section in self.typing_sections:
+            drain += section.get("endTime", 0) - section.get("startTime", 0)
+
+        return max(drain, 0)
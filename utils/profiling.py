@@ -0,0 +1,126 @@
+"""
+Profiles of slow commands, for diagnosing pathological maps after the fact.
+
+A sampled share of commands (PROFILE_SAMPLE_PERCENT) runs under pyinstrument,
+a sampling profiler that follows the command's asyncio task across awaits
+(time spent waiting shows up under the await) without picking up other
+commands running on the same loop. Jobs such a command starts are profiled in
+their worker and the sessions sent back with the result. When the command
+takes at least PROFILE_SLOW_MS its profile is written to PROFILE_DIR as a
+pstats dump (readable with pstats or snakeviz) and only the newest
+PROFILE_KEEP dumps are kept.
+"""
+import contextvars
+import logging
+import os
+import random
+import re
+import time
+from contextlib import contextmanager
+
+from pyinstrument import Profiler
+from pyinstrument.renderers import PstatsRenderer
+from pyinstrument.session import Session
+
+import config
+from utils import tracing
+
+logger = logging.getLogger(__name__)
+
+# Sessions of the current command's jobs, as sent back by their workers
+_job_sessions = contextvars.ContextVar("job_sessions", default=None)
+
+
+def _interval():
+    return max(config.PROFILE_INTERVAL_MS, 1) / 1000
+
+
+def _prune(directory, keep):
+    try:
+        dumps = [entry for entry in os.scandir(directory) if entry.name.endswith(".pstats")]
+    except FileNotFoundError:
+        return
+    dumps.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in dumps[keep:]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            # Another process got there first
+            pass
+
+
+def save_profile(session, label, directory=None, keep=None):
+    """Write a pyinstrument session as a pstats dump and drop the oldest ones. Returns its path."""
+    directory = config.PROFILE_DIR if directory is None else directory
+    keep = config.PROFILE_KEEP if keep is None else keep
+    os.makedirs(directory, exist_ok=True)
+
+    safe_label = re.sub(r"[^A-Za-z0-9_.-]+", "_", label)
+    trace_id = tracing.current_trace_id() or "untraced"
+    filename = f"{time.strftime('%Y%m%d-%H%M%S')}-{trace_id}-{safe_label}.pstats"
+    path = os.path.join(directory, filename)
+    # Keep every frame, as cProfile would; by default short ones (like a job
+    # after a long wait in the queue) are dropped. The renderer returns the
+    # marshalled stats as a surrogate-escaped str.
+    renderer = PstatsRenderer(processor_options={"filter_threshold": 0})
+    stats = renderer.render(session).encode("utf-8", errors="surrogateescape")
+    with open(path, "wb") as f:
+        f.write(stats)
+    _prune(directory, keep)
+    return path
+
+
+def is_profiling():
+    """Whether the current command is being profiled, so jobs it starts should be too."""
+    return _job_sessions.get() is not None
+
+
+@contextmanager
+def profile_if_slow(label):
+    """Profile the block if it's sampled, keeping the profile only if it turns out slow."""
+    if config.PROFILE_SLOW_MS <= 0 or random.random() * 100 >= config.PROFILE_SAMPLE_PERCENT:
+        yield
+        return
+
+    jobs = []
+    token = _job_sessions.set(jobs)
+    profiler = Profiler(interval=_interval(), async_mode="enabled")
+    start = time.perf_counter()
+    profiler.start()
+    try:
+        yield
+    finally:
+        session = profiler.stop()
+        _job_sessions.reset(token)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if elapsed_ms >= config.PROFILE_SLOW_MS:
+            for job in jobs:
+                session = Session.combine(session, Session.from_json(job))
+            try:
+                path = save_profile(session, label)
+            except OSError:
+                logger.warning(f"Could not save the profile of a slow {label}", exc_info=True)
+            else:
+                tracing.set_attributes(profile=path)
+                logger.warning(f"{label} took {elapsed_ms:.0f} ms, profile saved to {path}")
+
+
+def run_profiled(func, *args):
+    """
+    Run a job of a profiled command on the current thread under the profiler.
+    Returns the result and the session, as JSON that pickles back from a worker.
+    """
+    profiler = Profiler(interval=_interval(), async_mode="disabled")
+    profiler.start()
+    try:
+        result = func(*args)
+    finally:
+        session = profiler.stop()
+    return result, session.to_json()
+
+
+def add_job_profile(session):
+    """Add a job's session from `run_profiled` to the current command's profile."""
+    jobs = _job_sessions.get()
+    if jobs is not None and session is not None:
+        jobs.append(session)
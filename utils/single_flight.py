@@ -0,0 +1,32 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller starts the
+    work, later callers await the same in-flight task, and the key is released
+    as soon as it finishes.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+
+    def __contains__(self, key):
+        return key in self._inflight
+
+    async def run(self, key, func, *args, **kwargs):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._release(key, t))
+
+        # Shield so one caller giving up doesn't cancel the work for the others
+        return await asyncio.shield(task)
+
+    def _release(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved even if every caller went away
+            task.exception()
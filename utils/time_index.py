@@ -0,0 +1,54 @@
+from bisect import bisect_left, bisect_right
+
+
+class TimeIndex:
+    """
+    Sorted index of (time, value) pairs for tolerance-based lookups.
+
+    Entries remember the order they were added in, so lookups can reproduce
+    the result of a linear scan over the original sequence.
+    """
+
+    def __init__(self, items, tolerance):
+        self.tolerance = tolerance
+        entries = sorted(
+            ((time, order, value) for order, (time, value) in enumerate(items) if time is not None),
+            key=lambda e: (e[0], e[1])
+        )
+        self._times = [e[0] for e in entries]
+        self._orders = [e[1] for e in entries]
+        self._values = [e[2] for e in entries]
+
+    def __len__(self):
+        return len(self._times)
+
+    def _window(self, target_time):
+        lo = bisect_left(self._times, target_time - self.tolerance)
+        hi = bisect_right(self._times, target_time + self.tolerance)
+        return lo, hi
+
+    def has_near(self, target_time):
+        if target_time is None:
+            return False
+        lo, hi = self._window(target_time)
+        return lo < hi
+
+    def first_near(self, target_time, default=None):
+        """Value of the earliest added entry within tolerance of target_time."""
+        if target_time is None:
+            return default
+        lo, hi = self._window(target_time)
+        if lo == hi:
+            return default
+        best = min(range(lo, hi), key=self._orders.__getitem__)
+        return self._values[best]
+
+    def closest(self, target_time, default=None):
+        """Value of the nearest entry within tolerance; ties go to the earliest added."""
+        if target_time is None:
+            return default
+        lo, hi = self._window(target_time)
+        if lo == hi:
+            return default
+        best = min(range(lo, hi), key=lambda i: (abs(self._times[i] - target_time), self._orders[i]))
+        return self._values[best]
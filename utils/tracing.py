@@ -0,0 +1,155 @@
+"""
+Nested spans around the stages of a command, tracked through a context
+variable so they follow the request across awaits and into job workers.
+
+When a command's root span ends the whole tree is logged as one JSON line
+(if it took at least TRACE_LOG_MIN_MS), with each span's offset, duration,
+attributes and error.
+"""
+import contextvars
+import json
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+
+import config
+from utils import memory
+from utils.metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+
+    def __init__(self, name, attributes=None, parent=None, trace_id=None):
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.parent = parent
+        self.trace_id = trace_id or (parent.trace_id if parent else uuid.uuid4().hex[:16])
+        self.children = []
+        self.error = None
+        self.started_at = time.time()
+        self.duration = None
+        self._start = time.perf_counter()
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self):
+        if self.duration is None:
+            self.duration = time.perf_counter() - self._start
+
+    def to_dict(self, origin=None):
+        origin = self.started_at if origin is None else origin
+        data = {
+            "name": self.name,
+            "start_ms": round((self.started_at - origin) * 1000, 3),
+            "duration_ms": None if self.duration is None else round(self.duration * 1000, 3)
+        }
+        if self.attributes:
+            data["attributes"] = self.attributes
+        if self.error:
+            data["error"] = self.error
+        if self.children:
+            data["children"] = [child.to_dict(origin) for child in self.children]
+        return data
+
+    def __getstate__(self):
+        # Spans come back from workers without their parent chain
+        state = self.__dict__.copy()
+        state["parent"] = None
+        return state
+
+
+def current_span():
+    return _current.get()
+
+
+def current_trace_id():
+    span = _current.get()
+    return span.trace_id if span else None
+
+
+def set_attributes(**attributes):
+    """Tag the innermost open span, if there is one."""
+    span = _current.get()
+    if span is not None:
+        span.set(**attributes)
+
+
+def _emit(root):
+    if root.duration * 1000 < config.TRACE_LOG_MIN_MS:
+        return
+    trace = {"trace_id": root.trace_id, **root.to_dict()}
+    logger.info(json.dumps(trace, default=str, ensure_ascii=False))
+
+
+@contextmanager
+def span(name, **attributes):
+    """Time the block as a child of the current span, or as a new trace if there is none."""
+    parent = _current.get()
+    current = Span(name, attributes, parent)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+        raise
+    finally:
+        current.finish()
+        _current.reset(token)
+        if parent is not None:
+            parent.children.append(current)
+        else:
+            _emit(current)
+
+
+@contextmanager
+def stage(command, name, **attributes):
+    """
+    A span that also feeds the command's stage latency histogram and, inside
+    memory accounting, records the stage's peak memory as `peak_bytes` and
+    what measured it as `peak_meter`.
+    """
+    current = usage = None
+    try:
+        with span(name, **attributes) as current:
+            try:
+                with memory.track(name) as usage:
+                    yield current
+            finally:
+                if usage is not None and usage.bytes is not None:
+                    current.set(peak_bytes=usage.bytes, peak_meter=usage.meter)
+    finally:
+        if current is not None:
+            STAGE_SECONDS.observe(current.duration, command=command, stage=name)
+
+
+@contextmanager
+def capture(trace_id=None):
+    """
+    Collect the spans recorded during the block under a detached root, which
+    is yielded and never logged. Used in workers to send spans back with a
+    job's result; `attach` adds them to the trace in the parent process.
+    """
+    root = Span("job", trace_id=trace_id)
+    token = _current.set(root)
+    try:
+        yield root
+    finally:
+        root.finish()
+        _current.reset(token)
+
+
+def attach(captured):
+    """Merge a root from `capture` into the current span."""
+    span = _current.get()
+    if span is None:
+        return
+    span.set(**captured.attributes)
+    for child in captured.children:
+        child.parent = span
+        span.children.append(child)
@@ -0,0 +1,144 @@
+"""
+Verify .rtm files without Discord, one JSON line per mapset.
+
+    python verify.py maps/ "ranked/**/*.rtm" --jobs 8 --output results.jsonl
+
+Arguments can be files, directories (searched recursively for .rtm files)
+or glob patterns. Each line holds every check result with its timing, or
+the error that stopped the mapset from being verified.
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import config
+
+
+def find_archives(patterns):
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, files in os.walk(pattern):
+                paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(".rtm"))
+        elif os.path.isfile(pattern):
+            paths.append(pattern)
+        else:
+            paths.extend(p for p in glob.glob(pattern, recursive=True) if os.path.isfile(p))
+    # Keep the first occurrence of each file
+    return list(dict.fromkeys(os.path.normpath(p) for p in paths))
+
+
+def _result_record(result):
+    record = {
+        "status": result.status.value,
+        "name": result.name,
+        "message": result.message,
+        "elapsed_ms": None if result.elapsed_ms is None else round(result.elapsed_ms, 3)
+    }
+    if result.attachment:
+        filename, content = result.attachment
+        record["attachment"] = {"filename": filename, "content": content}
+    return record
+
+
+def verify_path(path):
+    """Analyze and check one archive. Never raises; failures end up in "error"."""
+    # Imported here so --help works without the analysis dependencies
+    from apis.rhythmtyper import analyze_beatmap
+    from pipeline.jobs import check_beatmap
+
+    record = {"path": path, "map": None, "mapset": [], "difficulties": [], "timings": {}, "error": None}
+    start = time.perf_counter()
+    try:
+        with open(path, "rb") as f:
+            result = analyze_beatmap(f)
+        analyzed = time.perf_counter()
+        record["timings"]["analyze_ms"] = round((analyzed - start) * 1000, 3)
+
+        meta_results, difficulty_results = check_beatmap(result)
+        record["timings"]["checks_ms"] = round((time.perf_counter() - analyzed) * 1000, 3)
+        if meta_results is None:
+            record["error"] = "Not a valid beatmap (missing meta.json)"
+            return record
+
+        meta = result["meta"]
+        record["map"] = {
+            "songName": meta.get("songName", "Unknown"),
+            "artistName": meta.get("artistName", "Unknown"),
+            "mapper": meta.get("mapper", "Unknown")
+        }
+        record["mapset"] = [_result_record(r) for r in meta_results]
+        record["difficulties"] = [
+            {
+                "name": diff.get("data", {}).get("name", "Unknown"),
+                "filename": diff.get("filename"),
+                "drain_time_ms": drain_time_ms,
+                "results": [_result_record(r) for r in results]
+            }
+            for diff, drain_time_ms, results in difficulty_results
+        ]
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        record["timings"]["total_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return record
+
+
+def _init_worker(use_cache):
+    # Parallelism comes from the processes, so checks run sequentially in each
+    config.CHECK_THREADS = 1
+    if not use_cache:
+        config.CHECK_CACHE_MAX_ENTRIES = 0
+
+
+def _worst_status(record):
+    if record["error"]:
+        return "error"
+    statuses = {r["status"] for r in record["mapset"]}
+    statuses.update(r["status"] for diff in record["difficulties"] for r in diff["results"])
+    for status in ("error", "fail", "warning"):
+        if status in statuses:
+            return status
+    return "pass"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="+", help=".rtm files, directories or glob patterns")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="worker processes (default: all cores)")
+    parser.add_argument("--output", "-o", help="write JSON lines here instead of stdout")
+    parser.add_argument("--no-cache", action="store_true", help="ignore and don't fill the check result cache")
+    args = parser.parse_args()
+
+    paths = find_archives(args.paths)
+    if not paths:
+        parser.error("no .rtm files found")
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    totals = {"pass": 0, "warning": 0, "fail": 0, "error": 0}
+    start = time.perf_counter()
+    try:
+        jobs = max(1, min(args.jobs, len(paths)))
+        with multiprocessing.get_context(config.WORKER_START_METHOD).Pool(
+            jobs, initializer=_init_worker, initargs=(not args.no_cache,)
+        ) as pool:
+            # Records are written as they finish, so the output order is not the input order
+            for record in pool.imap_unordered(verify_path, paths):
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                totals[_worst_status(record)] += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - start
+    summary = ", ".join(f"{count} {status}" for status, count in totals.items())
+    print(f"Verified {len(paths)} mapset(s) in {elapsed:.1f}s with {jobs} process(es): {summary}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()